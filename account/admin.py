@@ -1,12 +1,26 @@
 from django.contrib import admin
-from account.models import Branch, Account, AccountLog, Transaction
+from account.models import (
+    Branch,
+    BranchSequence,
+    Account,
+    AccountBalanceShard,
+    AccountLog,
+    CrossShardTransfer,
+    DailyBalance,
+    Hold,
+    JournalEntry,
+    Transaction,
+)
+from common.mixins import ReplicaReadModelAdmin
 
 # Register your models here.
 admin.site.register(
     Branch, list_display=["id", "branch_id", "branch_name", "is_active"]
 )
+admin.site.register(BranchSequence, list_display=["id", "branch", "last_value"])
 admin.site.register(
     Account,
+    ReplicaReadModelAdmin,
     list_display=[
         "id",
         "account_type",
@@ -15,15 +29,23 @@ admin.site.register(
         "account_number",
         "owner",
         "balance",
+        "balance_shards",
+        "held_balance",
         "create_at",
     ],
 )
+admin.site.register(
+    AccountBalanceShard,
+    list_display=["id", "account", "shard", "balance"],
+)
 admin.site.register(
     AccountLog,
+    ReplicaReadModelAdmin,
     list_display=["id", "message", "create_at"],
 )
 admin.site.register(
     Transaction,
+    ReplicaReadModelAdmin,
     list_display=[
         "id",
         "account",
@@ -33,3 +55,40 @@ admin.site.register(
         "create_at",
     ],
 )
+admin.site.register(
+    JournalEntry,
+    ReplicaReadModelAdmin,
+    list_display=["id", "entry_type", "amount", "maker", "create_at"],
+)
+admin.site.register(
+    Hold,
+    ReplicaReadModelAdmin,
+    list_display=[
+        "id",
+        "account",
+        "receiver_account",
+        "amount",
+        "status",
+        "maker",
+        "create_at",
+    ],
+)
+admin.site.register(
+    CrossShardTransfer,
+    ReplicaReadModelAdmin,
+    list_display=[
+        "id",
+        "transfer_id",
+        "direction",
+        "account",
+        "counterparty_account_number",
+        "amount",
+        "status",
+        "create_at",
+    ],
+)
+admin.site.register(
+    DailyBalance,
+    ReplicaReadModelAdmin,
+    list_display=["id", "account", "date", "closing_balance"],
+)
@@ -0,0 +1,104 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import router, transaction
+
+# buffer of the innermost account_log_batch() of this thread or task
+_buffer = contextvars.ContextVar("account_log_buffer", default=None)
+
+
+class AccountLogBuffer:
+    """
+    Queue ``AccountLog`` rows in memory and insert them with ``bulk_create``.
+
+    Rows are flushed once ``batch_size`` are queued or the oldest one has
+    waited ``flush_interval`` seconds, and always before the surrounding
+    transaction commits, so a log row is never committed without the state
+    change it describes, nor the other way around.
+    """
+
+    def __init__(self, batch_size: int = None, flush_interval: float = None):
+        self.batch_size = batch_size or settings.ACCOUNT_LOG_BATCH_SIZE
+        if flush_interval is None:
+            flush_interval = settings.ACCOUNT_LOG_FLUSH_INTERVAL
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.first_queued_at = None
+
+    def add(self, account, message: str):
+        from account.models import AccountLog
+
+        if not self.pending:
+            self.first_queued_at = time.monotonic()
+        self.pending.append(AccountLog(account=account, message=message))
+        self.flush_if_due()
+
+    def merge(self, other: "AccountLogBuffer"):
+        """Take over the rows of a nested batch whose savepoint was released."""
+        if not other.pending:
+            return
+
+        if not self.pending:
+            self.first_queued_at = other.first_queued_at
+        else:
+            self.first_queued_at = min(self.first_queued_at, other.first_queued_at)
+        self.pending.extend(other.pending)
+        other.pending = []
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        if (
+            len(self.pending) >= self.batch_size
+            or time.monotonic() - self.first_queued_at >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> int:
+        from account.models import AccountLog
+
+        count = len(self.pending)
+        if count:
+            AccountLog.objects.bulk_create(self.pending, batch_size=self.batch_size)
+            self.pending = []
+        return count
+
+
+def current_log_buffer() -> AccountLogBuffer | None:
+    return _buffer.get()
+
+
+@contextmanager
+def account_log_batch(batch_size: int = None, flush_interval: float = None):
+    """
+    ``transaction.atomic()`` in which ``Account.set_log`` is buffered.
+
+    A nested batch runs in a savepoint with a buffer of its own. Its rows are
+    handed to the outer buffer only when the savepoint is released, so the
+    logs of a rolled back block are dropped with its state changes. Runs on
+    the shard selected with ``use_shard()``.
+    """
+    from account.models import AccountLog
+
+    using = router.db_for_write(AccountLog)
+    outer = _buffer.get()
+    if outer is not None:
+        batch_size = batch_size or outer.batch_size
+        if flush_interval is None:
+            flush_interval = outer.flush_interval
+
+    buffer = AccountLogBuffer(batch_size, flush_interval)
+    token = _buffer.set(buffer)
+    try:
+        with transaction.atomic(using=using):
+            yield buffer
+            if outer is None:
+                # last rows go in before commit
+                buffer.flush()
+            rolled_back = transaction.get_rollback(using=using)
+
+        if outer is not None and not rolled_back:
+            outer.merge(buffer)
+    finally:
+        _buffer.reset(token)
@@ -0,0 +1,123 @@
+import time
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from core.db_routers import account_db, pin_to_primary, shard_aliases, use_shard
+
+# Summaries and their versions live in the default cache, which should be
+# shared by every worker: with the per-process locmem cache a version bump
+# only reaches the worker that made the change. A cached summary is only
+# served while the account state it was built from is unchanged, so the other
+# workers rebuild it instead of serving it stale, they just cache less. The
+# common.W001 check warns about it outside DEBUG.
+
+
+def summary_version_key(user_id: int) -> str:
+    return f"account-summary-version:{user_id}"
+
+
+def summary_key(user_id: int, version: int) -> str:
+    return f"account-summary:{user_id}:{version}"
+
+
+def _initial_version() -> int:
+    # time based, so a version lost to eviction never comes back lower
+    return time.time_ns() // 1_000_000
+
+
+def get_summary_version(user_id: int) -> int:
+    key = summary_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), settings.ACCOUNT_SUMMARY_CACHE_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_summary_version(user_ids: Iterable[int]):
+    """
+    Invalidate the cached account summary of ``user_ids``.
+
+    Runs once the current transaction commits, so a reader can never cache
+    the old state under the new version. The users also read from the
+    primary for a while, until the replica has the change too.
+    """
+    user_ids = set(user_ids)
+
+    def bump():
+        pin_to_primary(user_ids)
+        for user_id in user_ids:
+            key = summary_version_key(user_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(
+                    key, _initial_version(), settings.ACCOUNT_SUMMARY_CACHE_TIMEOUT
+                )
+
+    transaction.on_commit(bump, using=account_db())
+
+
+def get_summary_state(user_id: int) -> str:
+    """
+    Count, newest ``update_at`` and balance shard total of the accounts of
+    ``user_id`` on every account database.
+
+    Every balance, hold or status change moves it, whatever the cache holds,
+    so it validates the summary ETag and the cached summary.
+    """
+    from account.models import Account
+
+    state = []
+    for alias in shard_aliases():
+        with use_shard(alias):
+            state.append(
+                Account.objects.filter(owner_id=user_id).aggregate(
+                    count=Count("id", distinct=True),
+                    update_at=Max("update_at"),
+                    shards=Sum("shards__balance"),
+                )
+            )
+    return str(state)
+
+
+def get_account_summary(user, request, state: str = None) -> dict:
+    """``CustomerInquirySerializer`` data of ``user``, served from the cache."""
+    from account.models import Account
+    from account.readers import account_summary_data
+    from account.serializers import CustomerAccountDetailSerializer
+
+    if state is None:
+        state = get_summary_state(user.pk)
+
+    key = summary_key(user.pk, get_summary_version(user.pk))
+    cached = cache.get(key)
+    # a version bump may not have reached this worker's cache
+    if cached is not None and cached[0] == state:
+        return cached[1]
+
+    if settings.ACCOUNT_LEAN_READS:
+        data = account_summary_data(user)
+    else:
+        # the accounts of every shard, like account_summary_data(); balances
+        # of sharded accounts add up their shard rows
+        accounts = []
+        for alias in shard_aliases():
+            with use_shard(alias):
+                accounts += (
+                    Account.objects.filter(owner=user)
+                    .prefetch_related("shards")
+                    .order_by("id")
+                )
+        data = {
+            "username": user.username,
+            "accounts": CustomerAccountDetailSerializer(
+                accounts, many=True, context={"request": request}
+            ).data,
+        }
+    cache.set(key, (state, data), settings.ACCOUNT_SUMMARY_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,49 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# column order of the exported statement, matches AccountTransactionSerializer
+STATEMENT_EXPORT_COLUMNS = [
+    "transaction_type",
+    "amount",
+    "message",
+    "transfer_to",
+    "transfer_from",
+    "create_at",
+]
+STATEMENT_EXPORT_FIELDS = [
+    "transaction_type",
+    "amount",
+    "message",
+    "transfer_to_id",
+    "transfer_from_id",
+    "create_at",
+]
+
+
+class Echo:
+    """File-like object that hands back what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(STATEMENT_EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows):
+    # Decimal amounts are written as strings so no precision is lost
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(STATEMENT_EXPORT_COLUMNS, row))) + "\n"
+
+
+EXPORT_FORMATS = {
+    "csv": (stream_csv, "text/csv"),
+    "ndjson": (stream_ndjson, "application/x-ndjson"),
+}
@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand, CommandError
+
+from account.audit import account_log_batch
+from account.models import Account
+from core.db_routers import group_by_shard, shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Activate accounts in bulk, by number or every account waiting for activation"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("account_numbers", nargs="*")
+        parser.add_argument("--maker", required=True, help="username of admin/staff")
+        parser.add_argument(
+            "--waiting", action="store_true", help="activate every WAIT account"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        maker = User.objects.filter(username=options["maker"]).last()
+        if not maker:
+            raise CommandError("Not found user")
+
+        if options["waiting"]:
+            shards = {}
+            for alias in shard_aliases():
+                with use_shard(alias):
+                    shards[alias] = list(
+                        Account.objects.filter(
+                            status=Account.Status.WAIT_ACTIVATE
+                        ).values_list("account_number", flat=True)
+                    )
+        else:
+            shards = group_by_shard(options["account_numbers"])
+        if not any(shards.values()):
+            raise CommandError("No account to activate")
+
+        batch_size = options["batch_size"]
+        count = 0
+        for alias, account_numbers in shards.items():
+            with use_shard(alias):
+                for start in range(0, len(account_numbers), batch_size):
+                    with account_log_batch(batch_size=batch_size):
+                        count += len(
+                            Account.activate_many(
+                                account_numbers[start : start + batch_size],
+                                maker=maker,
+                            )
+                        )
+
+        self.stdout.write(f"Activated {count} accounts")
@@ -0,0 +1,90 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from account.models import Account, Branch, Transaction
+from account.readers import statement_data, statement_values
+from account.serializers import AccountTransactionSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the serializer and the lean read path on a synthetic statement."
+        " Rows are created in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options["rows"], options["repeat"])
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, rows, repeat):
+        user = User.objects.create(username=f"benchmark-{time.time_ns()}")
+        branch = Branch.objects.create(branch_id="BENCH", branch_name="Benchmark")
+        account = Account.objects.create(
+            account_number="BENCH0000000001",
+            owner=user,
+            branch=branch,
+            balance=Decimal("0"),
+            status=Account.Status.ACTIVE,
+        )
+
+        self.stdout.write(f"Creating {rows} transactions")
+        Transaction.objects.bulk_create(
+            (
+                Transaction(
+                    account=account,
+                    transaction_type=Transaction.Type.DEPOSIT,
+                    amount=Decimal(index % 1000) + Decimal("0.25"),
+                    message="Complete Deposit",
+                    maker=user,
+                )
+                for index in range(rows)
+            ),
+            batch_size=5000,
+        )
+        transactions = account.transactions.order_by("create_at", "id")
+
+        renderer = JSONRenderer()
+
+        def serializer():
+            return renderer.render(
+                AccountTransactionSerializer(transactions, many=True).data
+            )
+
+        def lean():
+            return renderer.render(statement_data(statement_values(transactions)))
+
+        assert serializer() == lean(), "read paths disagree"
+
+        results = {}
+        for name, func in (("serializer", serializer), ("lean", lean)):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - started)
+            results[name] = min(timings)
+            self.stdout.write(
+                f"{name:>10}: {results[name]:.3f}s"
+                f" ({rows / results[name]:,.0f} rows/s, best of {repeat})"
+            )
+
+        self.stdout.write(
+            f"Lean read path is {results['serializer'] / results['lean']:.1f}x faster"
+        )
@@ -0,0 +1,52 @@
+import datetime
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from account.models import Hold
+from core.db_routers import shard_aliases, use_shard
+from utils.date_utils import now
+
+
+class Command(BaseCommand):
+    help = "Capture authorized holds in batches and release expired ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.HOLD_CAPTURE_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--expire-hours", type=int, default=settings.HOLD_EXPIRE_HOURS
+        )
+        parser.add_argument(
+            "--release-only",
+            action="store_true",
+            help="only release expired holds, capture nothing",
+        )
+
+    def handle(self, *args, **options):
+        for alias in shard_aliases():
+            with use_shard(alias):
+                self.process(alias, options)
+
+    def process(self, alias, options):
+        expired = Hold.release_batch(
+            before=now() - datetime.timedelta(hours=options["expire_hours"])
+        )
+        self.stdout.write(f"[{alias}] Released {expired} expired holds")
+
+        if options["release_only"]:
+            return
+
+        total_captured = total_released = 0
+        while True:
+            captured, released = Hold.capture_batch(batch_size=options["batch_size"])
+            if not captured and not released:
+                break
+            total_captured += captured
+            total_released += released
+
+        self.stdout.write(
+            f"[{alias}] Captured {total_captured} holds, released {total_released}"
+            " with a closed receiver"
+        )
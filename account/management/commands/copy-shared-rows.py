@@ -0,0 +1,42 @@
+from django.apps import apps
+from django.core.management import BaseCommand
+
+from core.db_routers import REPLICATED_MODELS, copy_to_shards, shard_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy users, profiles and branches from the default database to every"
+        " shard. Run it once for a new shard, later changes are copied on save."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if len(shard_aliases()) == 1:
+            self.stdout.write("No shards configured")
+            return
+
+        batch_size = options["batch_size"]
+        for label in REPLICATED_MODELS:
+            model = apps.get_model(label)
+
+            count = 0
+            batch = []
+            for instance in (
+                model._base_manager.using("default")
+                .order_by("pk")
+                .iterator(chunk_size=batch_size)
+            ):
+                batch.append(instance)
+                if len(batch) >= batch_size:
+                    copy_to_shards(model, batch)
+                    count += len(batch)
+                    batch = []
+
+            if batch:
+                copy_to_shards(model, batch)
+                count += len(batch)
+
+            self.stdout.write(f"Copied {count} {model._meta.verbose_name_plural}")
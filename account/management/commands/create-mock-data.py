@@ -1,13 +1,44 @@
+import datetime
+import multiprocessing
+import os
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
 from django.core.management import BaseCommand
-from account.models import Branch, Account
+from django.db import connections
+from account import mock_data, partitions
+from account.models import Branch, BranchSequence, Account
 from common.helpers import create_user
 from common.models import Profile
+from core.db_routers import shard_aliases, shard_for_branch, use_shard
 from django.contrib.auth.models import User
 
 
 class Command(BaseCommand):
     help = "Start CLI"
 
+    def add_arguments(self, parser):
+        parser.add_argument("--branches", type=int, default=0)
+        parser.add_argument("--customers", type=int, default=0)
+        parser.add_argument("--accounts", type=int, default=0)
+        parser.add_argument("--transactions", type=int, default=0)
+        parser.add_argument(
+            "--months", type=int, default=12, help="history spread (default 12)"
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=2.0,
+            help="concentration of transactions on few accounts, 1 is even",
+        )
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--password", default="11test2@Pass04")
+        parser.add_argument("--seed", type=int, default=0)
+
     def handle(self, *args, **options):
         branch, _ = Branch.objects.get_or_create(
             branch_id="00000",
@@ -35,3 +66,136 @@ class Command(BaseCommand):
                 branch=branch,
             )
             account_a.save()
+
+        if any(
+            options[name]
+            for name in ("branches", "customers", "accounts", "transactions")
+        ):
+            self.generate(options, maker=user_staff)
+
+    def generate(self, options, maker):
+        started = time.monotonic()
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        shards = [alias for alias in shard_aliases() if alias != "default"]
+
+        branches = [
+            Branch.objects.get_or_create(
+                branch_id=str(index).zfill(5),
+                defaults={"branch_name": f"Branch {index}"},
+            )[0]
+            for index in range(1, options["branches"] + 1)
+        ] or [Branch.objects.get(branch_id="00000")]
+        mock_data.copy_branches(branches, shards)
+        # the staff user is the maker of every transaction
+        for alias in shards:
+            User.objects.using(alias).bulk_create([maker], ignore_conflicts=True)
+
+        # forked workers open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+
+        owner_ids = array("q")
+        customers = max(options["customers"], 1 if options["accounts"] else 0)
+        password = make_password(options["password"])
+        with ProcessPoolExecutor(options["workers"], mp_context=context) as pool:
+            for ids in pool.map(
+                mock_data.create_customers,
+                *zip(
+                    *[
+                        (start, min(start + batch_size, customers), password, shards)
+                        for start in range(0, customers, batch_size)
+                    ]
+                ),
+            ):
+                owner_ids.extend(ids)
+        self.stdout.write(f"{len(owner_ids)} customers")
+
+        account_ids = {}
+        tasks = []
+        counts = mock_data.split(
+            options["accounts"], mock_data.branch_weights(len(branches))
+        )
+        for branch, count in zip(branches, counts):
+            if not count:
+                continue
+            numbers = BranchSequence.reserve(branch, count)
+            alias = shard_for_branch(branch.branch_id)
+            for start in range(0, count, batch_size):
+                tasks.append(
+                    (
+                        alias,
+                        branch.pk,
+                        branch.branch_id,
+                        numbers[start : start + batch_size],
+                        rng.getrandbits(32),
+                    )
+                )
+
+        connections.close_all()
+        with ProcessPoolExecutor(
+            options["workers"],
+            mp_context=context,
+            initializer=mock_data.init_worker,
+            initargs=(owner_ids, {}),
+        ) as pool:
+            for task, ids in zip(
+                tasks, pool.map(mock_data.create_accounts, *zip(*tasks))
+            ):
+                account_ids.setdefault(task[0], array("q")).extend(ids)
+        self.stdout.write(
+            f"{sum(len(ids) for ids in account_ids.values())} accounts"
+            f" over {len(branches)} branches"
+        )
+
+        # shards get transactions in proportion to their accounts
+        tasks = []
+        total_accounts = sum(len(ids) for ids in account_ids.values())
+        aliases = list(account_ids)
+        counts = (
+            mock_data.split(
+                options["transactions"] if total_accounts else 0,
+                [len(account_ids[alias]) for alias in aliases],
+            )
+            if aliases
+            else []
+        )
+        for alias, count in zip(aliases, counts):
+            for start in range(0, count, batch_size):
+                tasks.append(
+                    (
+                        alias,
+                        min(batch_size, count - start),
+                        maker.pk,
+                        options["months"],
+                        options["skew"],
+                        rng.getrandbits(32),
+                    )
+                )
+
+        # rows of months without a partition would all land in the default one
+        history_start = mock_data.history_start(options["months"])
+        for alias in aliases:
+            with use_shard(alias):
+                if partitions.is_partitioned():
+                    partitions.create_partitions(
+                        history_start.date(),
+                        datetime.datetime.now(datetime.timezone.utc).date(),
+                    )
+
+        connections.close_all()
+        written = 0
+        with ProcessPoolExecutor(
+            options["workers"],
+            mp_context=context,
+            initializer=mock_data.init_worker,
+            initargs=(array("q"), account_ids),
+        ) as pool:
+            for count in pool.map(mock_data.create_transactions, *zip(*tasks)):
+                written += count
+
+        for alias in aliases:
+            mock_data.reconcile_balances(alias, account_ids[alias], batch_size)
+        self.stdout.write(
+            f"{written} transactions in {time.monotonic() - started:.1f}s"
+        )
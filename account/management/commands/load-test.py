@@ -0,0 +1,313 @@
+import datetime
+import json
+import math
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.test import APIClient
+
+from account.audit import account_log_batch
+from account.models import Account, Branch
+from common.helpers import create_user
+from common.models import Profile
+from core.db_backends.postgresql_pool.pool import get_pool_stats
+from core.db_routers import shard_for_branch, use_shard
+from utils.db_utils import get_conflict_stats
+
+OPERATIONS = ("deposit", "withdraw", "transfer", "inquiry", "statement")
+DEFAULT_MIX = "deposit=30,withdraw=20,transfer=30,inquiry=10,statement=10"
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise CommandError(f"Unknown operation {name}, use {', '.join(OPERATIONS)}")
+        try:
+            mix[name] = int(weight)
+        except ValueError:
+            raise CommandError(f"Invalid weight of {name}")
+
+    if sum(mix.values()) <= 0:
+        raise CommandError("Mix has no traffic")
+    return mix
+
+
+def percentile(timings: list[float], rank: float) -> float:
+    # nearest rank, timings are sorted
+    if not timings:
+        return 0.0
+    index = max(0, math.ceil(rank / 100 * len(timings)) - 1)
+    return timings[index]
+
+
+def summarize(results: list[tuple[float, int]]) -> dict:
+    timings = sorted(duration for duration, _ in results)
+    return {
+        "count": len(results),
+        "ok": sum(1 for _, status in results if status < 400),
+        "locked": sum(1 for _, status in results if status == 409),
+        "errors": sum(1 for _, status in results if status >= 400 and status != 409),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "max_ms": round(timings[-1] * 1000, 3) if timings else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive posting and inquiry traffic through the account API from many"
+        " concurrent clients and report latency percentiles. The accounts of the"
+        " load-test customer are reused between runs, missing ones are created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=8, help="client threads")
+        parser.add_argument(
+            "--duration", type=float, default=30, help="seconds to run (default 30)"
+        )
+        parser.add_argument(
+            "--requests", type=int, help="stop after this many requests per client"
+        )
+        parser.add_argument(
+            "--mix",
+            default=DEFAULT_MIX,
+            help=f"weights of {', '.join(OPERATIONS)} (default {DEFAULT_MIX})",
+        )
+        parser.add_argument("--accounts", type=int, default=50)
+        parser.add_argument(
+            "--hot-accounts",
+            type=int,
+            default=1,
+            help="accounts receiving --hot-ratio of the traffic",
+        )
+        parser.add_argument(
+            "--hot-ratio",
+            type=float,
+            default=0.0,
+            help="share of requests on the hot accounts, 0 spreads evenly",
+        )
+        parser.add_argument(
+            "--branch", default="00000", help="branch id of the accounts"
+        )
+        parser.add_argument("--seed", type=int)
+        parser.add_argument(
+            "--host",
+            default="localhost",
+            help="host header, must be in ALLOWED_HOSTS",
+        )
+        parser.add_argument("--output", help="write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options["mix"])
+        if options["accounts"] < 2:
+            raise CommandError("At least 2 accounts are needed for transfers")
+        if not 0 <= options["hot_ratio"] <= 1:
+            raise CommandError("--hot-ratio must be between 0 and 1")
+
+        branch = Branch.objects.filter(branch_id=options["branch"]).last()
+        if not branch:
+            raise CommandError("Invalid branch")
+
+        self.staff, self.customer = self.create_users()
+        account_numbers = self.get_accounts(branch, options["accounts"])
+        hot = account_numbers[
+            : max(1, min(options["hot_accounts"], len(account_numbers)))
+        ]
+        cold = account_numbers[len(hot) :] or hot
+
+        self.stdout.write(
+            f"Running {options['clients']} clients on {len(account_numbers)} accounts"
+            f" ({len(hot)} hot, ratio {options['hot_ratio']})"
+        )
+
+        results = {name: [] for name in mix}
+        results_lock = threading.Lock()
+        conflicts_before = get_conflict_stats()
+        deadline = time.monotonic() + options["duration"]
+        seed = options["seed"] if options["seed"] is not None else time.time_ns()
+
+        def pick(rng):
+            if rng.random() < options["hot_ratio"]:
+                return rng.choice(hot)
+            return rng.choice(cold)
+
+        def pick_receiver(rng, sender):
+            receiver = pick(rng)
+            if receiver != sender:
+                return receiver
+            # the hot accounts may all be the sender, draw from the others
+            index = rng.randrange(len(account_numbers) - 1)
+            if account_numbers[index] == sender:
+                return account_numbers[-1]
+            return account_numbers[index]
+
+        def client(index):
+            rng = random.Random(seed + index)
+            staff_client = APIClient(SERVER_NAME=options["host"])
+            staff_client.force_authenticate(self.staff)
+            customer_client = APIClient(SERVER_NAME=options["host"])
+            customer_client.force_authenticate(self.customer)
+            # count server errors instead of stopping the client
+            staff_client.raise_request_exception = False
+            customer_client.raise_request_exception = False
+
+            names = list(mix)
+            weights = [mix[name] for name in names]
+            local = []
+            sent = 0
+            try:
+                while time.monotonic() < deadline and (
+                    options["requests"] is None or sent < options["requests"]
+                ):
+                    name = rng.choices(names, weights)[0]
+                    started = time.perf_counter()
+                    status = self.send(
+                        name, staff_client, customer_client, pick, pick_receiver, rng
+                    )
+                    local.append((name, time.perf_counter() - started, status))
+                    sent += 1
+            finally:
+                connections.close_all()
+                with results_lock:
+                    for name, duration, status in local:
+                        results[name].append((duration, status))
+
+        threads = [
+            threading.Thread(target=client, args=(index,))
+            for index in range(options["clients"])
+        ]
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        conflicts_after = get_conflict_stats()
+        conflicts = {
+            name: count - conflicts_before.get(name, 0)
+            for name, count in conflicts_after.items()
+            if count != conflicts_before.get(name, 0)
+        }
+
+        report = self.build_report(
+            options, mix, results, started_at, elapsed, conflicts
+        )
+        self.print_report(report)
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def create_users(self):
+        staff = create_user(
+            username="load-test-staff", password=None, role=Profile.Role.STAFF
+        )
+        customer = create_user(
+            username="load-test-customer",
+            password=None,
+            role=Profile.Role.CUSTOMER,
+        )
+        return staff, customer
+
+    def get_accounts(self, branch, count):
+        # lookup, creation and activation all run on the branch's shard
+        with use_shard(shard_for_branch(branch.branch_id)):
+            account_numbers = list(
+                Account.objects.filter(owner=self.customer, branch=branch)
+                .order_by("id")
+                .values_list("account_number", flat=True)[:count]
+            )
+            if len(account_numbers) < count:
+                self.stdout.write(f"Creating {count - len(account_numbers)} accounts")
+                account_numbers += [
+                    Account.create_account(
+                        maker=self.staff,
+                        owner=self.customer,
+                        balance=Decimal("1000000"),
+                        branch=branch,
+                        account_type=Account.Type.SAVING,
+                    ).account_number
+                    for _ in range(count - len(account_numbers))
+                ]
+            with account_log_batch():
+                Account.activate_many(account_numbers, maker=self.staff)
+        return account_numbers
+
+    def send(self, name, staff_client, customer_client, pick, pick_receiver, rng):
+        amount = Decimal(rng.randint(1, 1000)) / 100
+        account_number = pick(rng)
+
+        if name in ("deposit", "withdraw"):
+            response = staff_client.put(
+                f"/api/account/customer/{account_number}/{name}/",
+                {"amount": amount, "receiver_account_number": None},
+                format="json",
+            )
+        elif name == "transfer":
+            receiver_account_number = pick_receiver(rng, account_number)
+            response = staff_client.put(
+                f"/api/account/customer/{account_number}/transfer/",
+                {"amount": amount, "receiver_account_number": receiver_account_number},
+                format="json",
+            )
+        elif name == "inquiry":
+            response = customer_client.get("/api/account/financial/")
+        else:
+            response = customer_client.get(
+                f"/api/account/financial/{account_number}/statement/"
+            )
+        return response.status_code
+
+    def build_report(self, options, mix, results, started_at, elapsed, conflicts):
+        everything = [result for operation in results.values() for result in operation]
+        return {
+            "started_at": started_at.isoformat(),
+            "options": {
+                "clients": options["clients"],
+                "duration": options["duration"],
+                "requests": options["requests"],
+                "mix": mix,
+                "accounts": options["accounts"],
+                "hot_accounts": options["hot_accounts"],
+                "hot_ratio": options["hot_ratio"],
+            },
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_rps": round(len(everything) / elapsed, 2) if elapsed else 0.0,
+            "total": summarize(everything),
+            "operations": {name: summarize(result) for name, result in results.items()},
+            "db_conflicts": {
+                "deadlock": conflicts.get("deadlock", 0),
+                "serialization_failure": conflicts.get("serialization_failure", 0),
+                "lock_not_available": conflicts.get("lock_not_available", 0),
+                "gave_up": conflicts.get("gave_up", 0),
+            },
+            "connection_pools": get_pool_stats(),
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{'operation':<10} {'count':>7} {'ok':>7} {'locked':>7} {'errors':>7}"
+            f" {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        )
+        rows = list(report["operations"].items()) + [("total", report["total"])]
+        for name, stats in rows:
+            self.stdout.write(
+                f"{name:<10} {stats['count']:>7} {stats['ok']:>7} {stats['locked']:>7}"
+                f" {stats['errors']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f}"
+                f" {stats['p99_ms']:>9.2f}"
+            )
+        self.stdout.write(
+            f"{report['throughput_rps']} requests/s over {report['elapsed_seconds']}s,"
+            f" conflicts {report['db_conflicts']}"
+        )
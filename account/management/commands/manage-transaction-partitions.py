@@ -0,0 +1,64 @@
+import datetime
+
+from dateutil.relativedelta import relativedelta
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from account import partitions
+from core.db_routers import shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly transaction partitions and detach old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=3,
+            help="months to create after the current one (default 3)",
+        )
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            help="detach partitions older than this many months, keep all if omitted",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="drop detached partitions instead of keeping them as plain tables",
+        )
+
+    def handle(self, *args, **options):
+        for alias in shard_aliases():
+            with use_shard(alias):
+                self.process(alias, options)
+
+    def process(self, alias, options):
+        if not partitions.is_partitioned():
+            raise CommandError(
+                f"{partitions.PARENT_TABLE} is not partitioned on {alias}, run the migrations on PostgreSQL first"
+            )
+
+        current = partitions.month_start(timezone.localdate())
+
+        with transaction.atomic(using=alias):
+            for offset in range(options["ahead"] + 1):
+                month = current + relativedelta(months=offset)
+                if partitions.create_partition(month):
+                    self.stdout.write(
+                        f"[{alias}] Created {partitions.partition_name(month)}"
+                    )
+
+            retain_months = options["retain_months"]
+            if retain_months is not None:
+                oldest = current - relativedelta(months=retain_months)
+                for name in partitions.list_partitions():
+                    if name == partitions.DEFAULT_PARTITION:
+                        continue
+                    month = datetime.datetime.strptime(name[-6:], "%Y%m").date()
+                    if month < oldest and partitions.detach_partition(
+                        month, drop=options["drop"]
+                    ):
+                        self.stdout.write(f"[{alias}] Detached {name}")
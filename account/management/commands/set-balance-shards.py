@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand, CommandError
+
+from account.models import Account
+from core.db_routers import shard_for_account_number, use_shard
+
+
+class Command(BaseCommand):
+    help = "Spread the balance of a hot account over several rows (1 to merge back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("account_number")
+        parser.add_argument("shards", type=int)
+
+    def handle(self, *args, **options):
+        with use_shard(shard_for_account_number(options["account_number"])):
+            account = Account.objects.filter(
+                account_number=options["account_number"]
+            ).last()
+            if not account:
+                raise CommandError("Invalid account")
+
+            try:
+                account.set_balance_shards(options["shards"])
+            except Exception as error:
+                raise CommandError(str(error))
+
+        self.stdout.write(
+            f"{account} balance is spread over {account.balance_shards} shard(s)"
+        )
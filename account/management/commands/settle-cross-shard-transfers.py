@@ -0,0 +1,39 @@
+import datetime
+
+from django.core.management import BaseCommand
+
+from account.models import CrossShardTransfer
+from core.db_routers import shard_aliases, use_shard
+from utils.date_utils import now
+
+
+class Command(BaseCommand):
+    help = "Finish cross-shard transfers left PREPARED by an interrupted request"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=60,
+            help="seconds since prepared, younger ones may still be settling",
+        )
+
+    def handle(self, *args, **options):
+        before = now() - datetime.timedelta(seconds=options["older_than"])
+
+        completed = failed = 0
+        for alias in shard_aliases():
+            with use_shard(alias):
+                transfers = CrossShardTransfer.objects.filter(
+                    direction=CrossShardTransfer.Direction.OUT,
+                    status=CrossShardTransfer.Status.PREPARED,
+                    create_at__lt=before,
+                ).select_related("account")
+
+                for transfer in transfers:
+                    if transfer.settle():
+                        completed += 1
+                    else:
+                        failed += 1
+
+        self.stdout.write(f"Completed {completed} transfers, failed {failed}")
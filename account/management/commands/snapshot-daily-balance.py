@@ -0,0 +1,31 @@
+import datetime
+
+from django.core.management import BaseCommand, CommandError
+from django.utils import timezone
+
+from account.models import DailyBalance
+from core.db_routers import shard_aliases, use_shard
+from utils.date_utils import parse_datetime
+
+
+class Command(BaseCommand):
+    help = "Store the closing balance of every account for a day (default yesterday)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="day to snapshot, i.e. 2025-02-10")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options["date"]:
+            parsed = parse_datetime(options["date"])
+            if parsed is None:
+                raise CommandError("Invalid date")
+            date = parsed.date()
+        else:
+            date = timezone.localdate() - datetime.timedelta(days=1)
+
+        count = 0
+        for alias in shard_aliases():
+            with use_shard(alias):
+                count += DailyBalance.snapshot(date, batch_size=options["batch_size"])
+        self.stdout.write(f"Stored {count} daily balances for {date}")
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-18 14:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_branch_sequence(apps, schema_editor):
+    Branch = apps.get_model('account', 'Branch')
+    Account = apps.get_model('account', 'Account')
+    BranchSequence = apps.get_model('account', 'BranchSequence')
+    db_alias = schema_editor.connection.alias
+
+    for branch in Branch.objects.using(db_alias).all():
+        account_numbers = Account.objects.using(db_alias).filter(branch=branch).values_list('account_number', flat=True)
+        last_value = len(account_numbers)
+        for account_number in account_numbers:
+            suffix = account_number[-9:]
+            if suffix.isdigit():
+                last_value = max(last_value, int(suffix))
+        BranchSequence.objects.using(db_alias).create(branch=branch, last_value=last_value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_alter_account_account_number_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BranchSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_value', models.BigIntegerField(default=0)),
+                ('branch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sequence', to='account.branch')),
+            ],
+        ),
+        migrations.RunPython(seed_branch_sequence, migrations.RunPython.noop),
+    ]
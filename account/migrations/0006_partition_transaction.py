@@ -0,0 +1,123 @@
+# Convert account_transaction into a table partitioned by month on create_at.
+#
+# PostgreSQL only, other databases keep the plain table. The rows are copied
+# into the new partitioned table, so run it in a maintenance window when the
+# table is already large.
+
+from dateutil.relativedelta import relativedelta
+from django.db import migrations
+
+CREATE_PARTITIONED = """
+CREATE TABLE account_transaction (
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    transaction_type varchar NOT NULL,
+    amount numeric(21, 2) NOT NULL,
+    message varchar NULL,
+    create_at timestamp with time zone NOT NULL,
+    account_id bigint NOT NULL
+        REFERENCES account_account (id) DEFERRABLE INITIALLY DEFERRED,
+    maker_id integer NOT NULL
+        REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED,
+    transfer_to_id bigint NULL
+        REFERENCES account_account (id) DEFERRABLE INITIALLY DEFERRED,
+    PRIMARY KEY (id, create_at)
+) PARTITION BY RANGE (create_at)
+"""
+
+CREATE_PLAIN = """
+CREATE TABLE account_transaction (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    transaction_type varchar NOT NULL,
+    amount numeric(21, 2) NOT NULL,
+    message varchar NULL,
+    create_at timestamp with time zone NOT NULL,
+    account_id bigint NOT NULL
+        REFERENCES account_account (id) DEFERRABLE INITIALLY DEFERRED,
+    maker_id integer NOT NULL
+        REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED,
+    transfer_to_id bigint NULL
+        REFERENCES account_account (id) DEFERRABLE INITIALLY DEFERRED
+)
+"""
+
+COLUMNS = "id, transaction_type, amount, message, create_at, account_id, maker_id, transfer_to_id"
+
+CREATE_INDEXES = [
+    "CREATE INDEX account_transaction_account_id ON account_transaction (account_id)",
+    "CREATE INDEX account_transaction_maker_id ON account_transaction (maker_id)",
+    "CREATE INDEX account_transaction_transfer_to_id ON account_transaction (transfer_to_id)",
+    "CREATE INDEX transaction_statement_idx ON account_transaction (account_id, create_at, id)",
+]
+
+
+def _swap_table(cursor, create_sql):
+    cursor.execute("ALTER TABLE account_transaction RENAME TO account_transaction_old")
+    cursor.execute("ALTER INDEX transaction_statement_idx RENAME TO transaction_statement_idx_old")
+    cursor.execute(create_sql)
+
+
+def _copy_rows(cursor):
+    cursor.execute(
+        f"INSERT INTO account_transaction ({COLUMNS})"
+        f" SELECT {COLUMNS} FROM account_transaction_old"
+    )
+    # fire the deferred foreign key checks before altering the table again
+    cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+    cursor.execute("DROP TABLE account_transaction_old")
+    cursor.execute(
+        "SELECT setval(pg_get_serial_sequence('account_transaction', 'id'),"
+        " COALESCE((SELECT max(id) FROM account_transaction), 0) + 1, false)"
+    )
+    for sql in CREATE_INDEXES:
+        cursor.execute(sql)
+
+
+def partition_transaction(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        _swap_table(cursor, CREATE_PARTITIONED)
+        cursor.execute(
+            "CREATE TABLE account_transaction_default"
+            " PARTITION OF account_transaction DEFAULT"
+        )
+
+        # one partition per month of existing data, up to three months ahead
+        cursor.execute(
+            "SELECT month FROM generate_series("
+            " date_trunc('month', COALESCE((SELECT min(create_at) FROM account_transaction_old), now()) AT TIME ZONE 'UTC'),"
+            " date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',"
+            " interval '1 month') AS month"
+        )
+        for (month,) in cursor.fetchall():
+            cursor.execute(
+                f"CREATE TABLE account_transaction_p{month:%Y%m}"
+                " PARTITION OF account_transaction FOR VALUES FROM (%s) TO (%s)",
+                [
+                    f"{month:%Y-%m-%d} 00:00:00+00",
+                    f"{month + relativedelta(months=1):%Y-%m-%d} 00:00:00+00",
+                ],
+            )
+
+        _copy_rows(cursor)
+
+
+def unpartition_transaction(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        _swap_table(cursor, CREATE_PLAIN)
+        _copy_rows(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_dailybalance'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_transaction, unpartition_transaction),
+    ]
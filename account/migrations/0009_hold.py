@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0008_accountbalanceshard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='held_balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=21),
+        ),
+        migrations.CreateModel(
+            name='Hold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=21)),
+                ('status', models.CharField(choices=[('AUTHORIZED', 'AUTHORIZED'), ('CAPTURED', 'CAPTURED'), ('RELEASED', 'RELEASED')], default='AUTHORIZED')),
+                ('create_at', models.DateTimeField(auto_now_add=True)),
+                ('update_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='account.account')),
+                ('entry', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='account.journalentry')),
+                ('maker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('receiver_account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='account.account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'create_at'], name='hold_status_idx')],
+            },
+        ),
+    ]
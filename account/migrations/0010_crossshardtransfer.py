@@ -0,0 +1,37 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:20
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0009_hold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrossShardTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transfer_id', models.UUIDField(default=uuid.uuid4)),
+                ('direction', models.CharField(choices=[('OUT', 'OUT'), ('IN', 'IN')])),
+                ('counterparty_account_number', models.CharField(max_length=16)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=21)),
+                ('status', models.CharField(choices=[('PREPARED', 'PREPARED'), ('COMPLETED', 'COMPLETED'), ('FAILED', 'FAILED')], default='PREPARED')),
+                ('create_at', models.DateTimeField(auto_now_add=True)),
+                ('update_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cross_shard_transfers', to='account.account')),
+                ('hold', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='cross_shard_transfer', to='account.hold')),
+                ('maker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='crossshardtransfer',
+            constraint=models.UniqueConstraint(fields=('transfer_id', 'direction'), name='cross_shard_transfer_side_unique'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:52
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0010_crossshardtransfer'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='branch',
+            name='branch_id',
+            field=models.CharField(max_length=5, unique=True, validators=[django.core.validators.MinLengthValidator(5)]),
+        ),
+        migrations.AddConstraint(
+            model_name='branch',
+            constraint=models.CheckConstraint(check=models.Q(('branch_id__regex', '^.{5}$')), name='branch_id_length'),
+        ),
+    ]
@@ -0,0 +1,268 @@
+"""
+Bulk mock data for load and index tests.
+
+The functions run in worker processes of ``create-mock-data``, each one
+writing one batch of rows through its own database connection. Customer
+and account ids are handed to the workers once, through ``init_worker()``.
+
+Distributions: accounts are spread over branches by a Zipf law (the first
+branches are the busiest), balances and amounts are log-normal, and
+transactions favour a minority of the accounts, ``skew`` 1 spreading them
+evenly. Balances are reconciled with the generated history afterwards, see
+``reconcile_balances()``.
+"""
+
+import datetime
+import io
+import random
+from array import array
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import F, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from account.models import Account, Branch, Transaction
+from common.models import Profile
+
+# set in every worker process by init_worker()
+_owner_ids = array("q")
+_account_ids: dict[str, array] = {}
+
+TRANSACTION_COLUMNS = (
+    "account_id",
+    "transaction_type",
+    "amount",
+    "message",
+    "transfer_to_id",
+    "transfer_from_id",
+    "maker_id",
+    "create_at",
+)
+
+
+def init_worker(owner_ids: array, account_ids: dict[str, array]):
+    _owner_ids.extend(owner_ids)
+    _account_ids.update(account_ids)
+
+
+def branch_weights(count: int) -> list[float]:
+    return [1 / (index + 1) for index in range(count)]
+
+
+def split(total: int, weights: list[float]) -> list[int]:
+    """Split ``total`` in proportion to ``weights``, exactly."""
+    scale = sum(weights)
+    counts = [int(total * weight / scale) for weight in weights]
+    for index in range(total - sum(counts)):
+        counts[index % len(counts)] += 1
+    return counts
+
+
+def create_customers(start: int, stop: int, password: str, aliases: list[str]):
+    """Customers ``mock-customer-<n>`` for ``n`` in ``[start, stop)``, with ids."""
+    usernames = [f"mock-customer-{index}" for index in range(start, stop)]
+    User.objects.bulk_create(
+        [User(username=username, password=password) for username in usernames],
+        ignore_conflicts=True,
+    )
+    users = list(User.objects.filter(username__in=usernames))
+
+    with_profile = set(
+        Profile.objects.filter(user__in=users).values_list("user_id", flat=True)
+    )
+    Profile.objects.bulk_create(
+        Profile(user=user, role=Profile.Role.CUSTOMER)
+        for user in users
+        if user.pk not in with_profile
+    )
+
+    # owners are referenced by foreign key on every shard
+    for alias in aliases:
+        User.objects.using(alias).bulk_create(users, ignore_conflicts=True)
+
+    return array("q", (user.pk for user in users))
+
+
+def create_accounts(
+    alias: str,
+    branch_pk: int,
+    branch_id: str,
+    numbers: range,
+    seed: int,
+):
+    """Accounts numbered ``numbers`` in one branch, stored on ``alias``."""
+    rng = random.Random(seed)
+    accounts = []
+    for number in numbers:
+        account_type = (
+            Account.Type.SAVING if rng.random() < 0.85 else Account.Type.FIXED
+        )
+        draw = rng.random()
+        if draw < 0.95:
+            status = Account.Status.ACTIVE
+        elif draw < 0.98:
+            status = Account.Status.WAIT_ACTIVATE
+        else:
+            status = Account.Status.INACTIVE
+
+        accounts.append(
+            Account(
+                account_number=branch_id + account_type + str(number).zfill(9),
+                owner_id=_owner_ids[rng.randrange(len(_owner_ids))],
+                branch_id=branch_pk,
+                account_type=account_type,
+                balance=Decimal(f"{rng.lognormvariate(9, 1.5):.2f}"),
+                status=status,
+            )
+        )
+
+    Account.objects.using(alias).bulk_create(accounts)
+    return array("q", (account.pk for account in accounts))
+
+
+def generate_transactions(
+    alias: str, count: int, maker_id: int, months: int, skew: float, seed: int
+):
+    """Rows of ``count`` transactions, a transfer makes two of them."""
+    rng = random.Random(seed)
+    account_ids = _account_ids[alias]
+    size = len(account_ids)
+    start = history_start(months)
+    span = (datetime.datetime.now(datetime.timezone.utc) - start).total_seconds()
+
+    def pick():
+        return account_ids[min(size - 1, int(size * rng.random() ** skew))]
+
+    rows = 0
+    while rows < count:
+        account_id = pick()
+        amount = f"{rng.lognormvariate(6, 1.2):.2f}"
+        create_at = (
+            start + datetime.timedelta(seconds=rng.random() * span)
+        ).isoformat()
+        draw = rng.random()
+
+        if draw < 0.3 and size > 1 and count - rows > 1:
+            receiver_id = pick()
+            while receiver_id == account_id:
+                receiver_id = account_ids[rng.randrange(size)]
+            yield (
+                account_id,
+                Transaction.Type.TRANSFER,
+                amount,
+                "Complete Transfer",
+                receiver_id,
+                None,
+                maker_id,
+                create_at,
+            )
+            yield (
+                receiver_id,
+                Transaction.Type.DEPOSIT,
+                amount,
+                "Complete Deposit",
+                None,
+                account_id,
+                maker_id,
+                create_at,
+            )
+            rows += 2
+        elif draw < 0.7:
+            yield (
+                account_id,
+                Transaction.Type.DEPOSIT,
+                amount,
+                "Complete Deposit",
+                None,
+                None,
+                maker_id,
+                create_at,
+            )
+            rows += 1
+        else:
+            yield (
+                account_id,
+                Transaction.Type.WITHDRAW,
+                amount,
+                "Complete Withdraw",
+                None,
+                None,
+                maker_id,
+                create_at,
+            )
+            rows += 1
+
+
+def create_transactions(
+    alias: str, count: int, maker_id: int, months: int, skew: float, seed: int
+) -> int:
+    """Write ``count`` transactions on ``alias``, with COPY on PostgreSQL."""
+    rows = generate_transactions(alias, count, maker_id, months, skew, seed)
+    connection = connections[alias]
+
+    if connection.vendor != "postgresql":
+        # create_at is set by auto_now_add, so every row is dated now
+        Transaction.objects.using(alias).bulk_create(
+            Transaction(**dict(zip(TRANSACTION_COLUMNS, row))) for row in rows
+        )
+        return count
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(
+            "\t".join(r"\N" if value is None else str(value) for value in row) + "\n"
+        )
+    buffer.seek(0)
+
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {quote(Transaction._meta.db_table)}"
+            f" ({', '.join(quote(column) for column in TRANSACTION_COLUMNS)})"
+            " FROM STDIN",
+            buffer,
+        )
+    return count
+
+
+def history_start(months: int) -> datetime.datetime:
+    """Oldest ``create_at`` that ``generate_transactions()`` can draw."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return now - datetime.timedelta(days=30 * months)
+
+
+def reconcile_balances(alias: str, account_ids: array, batch_size: int):
+    """
+    Add the deposits of the generated history to the balances of accounts.
+
+    The generated balance is taken as what is left once every withdrawal and
+    transfer has been paid, so no balance of the history goes below zero.
+    Accounts are dated back to their first transaction for ``balance_as_of()``.
+    """
+    transactions = (
+        Transaction.objects.using(alias)
+        .filter(account=OuterRef("pk"))
+        .order_by()
+        .values("account")
+    )
+    deposits = (
+        transactions.filter(transaction_type=Transaction.Type.DEPOSIT)
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    first = transactions.annotate(first=Min("create_at")).values("first")
+
+    for start in range(0, len(account_ids), batch_size):
+        Account.objects.using(alias).filter(
+            pk__in=list(account_ids[start : start + batch_size])
+        ).update(
+            balance=F("balance") + Coalesce(Subquery(deposits), Value(Decimal(0))),
+            create_at=Coalesce(Subquery(first), F("create_at")),
+        )
+
+
+def copy_branches(branches: list[Branch], aliases: list[str]):
+    for alias in aliases:
+        Branch.objects.using(alias).bulk_create(branches, ignore_conflicts=True)
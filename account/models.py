@@ -1,20 +1,144 @@
+import datetime
+import random
+import threading
+import uuid
+from decimal import ROUND_DOWN, Decimal
 from typing import Iterable
-from django.db import models
+from django.conf import settings
+from django.core.validators import MinLengthValidator
+from django.db import (
+    IntegrityError,
+    connection,
+    connections,
+    models,
+    router,
+    transaction,
+)
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import User
 
+from account.audit import current_log_buffer
+from account.cache import bump_summary_version
+from core.db_routers import (
+    account_db,
+    shard_for_account_number,
+    shard_for_branch,
+    use_shard,
+)
+from utils.date_utils import date_start
+from utils.db_utils import lock_rows
+
 
 class Branch(models.Model):
 
-    branch_id = models.CharField(max_length=5, unique=True)
+    # exactly 5 characters, account numbers start with it (see the shard router)
+    branch_id = models.CharField(
+        max_length=5, unique=True, validators=[MinLengthValidator(5)]
+    )
     branch_name = models.CharField()
     is_active = models.BooleanField(default=True)
     create_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(branch_id__regex=r"^.{5}$"), name="branch_id_length"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.branch_name} ({self.branch_id})"
 
 
+# account number blocks reserved by this process, keyed by branch pk
+_account_number_blocks: dict[int, range] = {}
+_account_number_lock = threading.Lock()
+
+
+class BranchSequence(models.Model):
+    """
+    Per-branch account number counter.
+
+    Numbers are reserved from the counter row in blocks of
+    ``ACCOUNT_NUMBER_BLOCK_SIZE`` and handed out from memory, so opening an
+    account rarely touches the row. Unused numbers of a block are simply
+    skipped when the process exits.
+    """
+
+    branch = models.OneToOneField(
+        Branch, on_delete=models.CASCADE, related_name="sequence"
+    )
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Sequence {self.branch} ({self.last_value})"
+
+    @classmethod
+    def reserve(cls, branch: Branch, size: int) -> range:
+        """Reserve ``size`` consecutive numbers for ``branch`` with one UPDATE."""
+        table = connection.ops.quote_name(cls._meta.db_table)
+
+        for _ in range(2):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {table} SET last_value = last_value + %s"
+                    " WHERE branch_id = %s RETURNING last_value",
+                    [size, branch.pk],
+                )
+                row = cursor.fetchone()
+
+            if row is not None:
+                return range(row[0] - size + 1, row[0] + 1)
+
+            # first account of this branch
+            cls.objects.get_or_create(branch=branch)
+
+        raise Exception(f"Cannot reserve account number for {branch}")
+
+    @classmethod
+    def next_value(cls, branch: Branch) -> int:
+        with _account_number_lock:
+            block = _account_number_blocks.pop(branch.pk, None)
+            if block:
+                if len(block) > 1:
+                    _account_number_blocks[branch.pk] = block[1:]
+                return block[0]
+
+        # the counter row serialises reservations of the same branch, the
+        # process lock is not held across the round-trip
+        block = cls.reserve(branch, settings.ACCOUNT_NUMBER_BLOCK_SIZE)
+
+        # only reuse the rest of the block once the reservation is committed
+        remaining = block[1:]
+        if remaining:
+
+            def keep_remaining():
+                with _account_number_lock:
+                    _account_number_blocks.setdefault(branch.pk, remaining)
+
+            transaction.on_commit(keep_remaining)
+
+        return block[0]
+
+
+class AccountQuerySet(models.QuerySet):
+
+    def filter(self, *args, **kwargs):
+        """Lookups by account number go straight to the shard of its branch."""
+        queryset = super().filter(*args, **kwargs)
+
+        account_number = kwargs.get("account_number")
+        if self._db is None and isinstance(account_number, str):
+            alias = shard_for_account_number(account_number)
+            if alias != account_db():
+                queryset = queryset.using(alias)
+
+        return queryset
+
+
 class Account(models.Model):
 
     class Type(models.TextChoices):
@@ -32,9 +156,15 @@ class Account(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="accounts")
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name="branch")
     balance = models.DecimalField(max_digits=21, decimal_places=2)
+    # hot accounts spread their balance over this many rows, see AccountBalanceShard
+    balance_shards = models.PositiveSmallIntegerField(default=1)
+    # reserved by authorized holds, always covered by the account row balance
+    held_balance = models.DecimalField(max_digits=21, decimal_places=2, default=0)
     create_at = models.DateTimeField(auto_now_add=True)
     update_at = models.DateTimeField(auto_now=True)
 
+    objects = AccountQuerySet.as_manager()
+
     def __str__(self) -> str:
         return f"Account ({self.account_number})"
 
@@ -42,7 +172,42 @@ class Account(models.Model):
     def is_active(self):
         return self.status == self.Status.ACTIVE
 
+    @property
+    def is_sharded(self):
+        return self.balance_shards > 1
+
+    @property
+    def total_balance(self) -> Decimal:
+        """Balance including every shard of a sharded account."""
+        if not self.is_sharded:
+            return self.balance
+        return self.balance + sum(shard.balance for shard in self.shards.all())
+
+    @property
+    def available_balance(self) -> Decimal:
+        """Balance that is not reserved by an authorized hold."""
+        return self.total_balance - self.held_balance
+
+    @classmethod
+    def shard_balance_subquery(cls):
+        """Sum of the shard rows of each account, to annotate onto querysets."""
+        shard_total = (
+            AccountBalanceShard.objects.filter(account=OuterRef("pk"))
+            .values("account")
+            .annotate(total=Sum("balance"))
+            .values("total")
+        )
+        return Coalesce(
+            Subquery(shard_total), Decimal("0"), output_field=models.DecimalField()
+        )
+
     def set_log(self, message: str):
+        # queued when called inside account_log_batch()
+        buffer = current_log_buffer()
+        if buffer is not None:
+            buffer.add(self, message)
+            return
+
         AccountLog.objects.create(account=self, message=message)
 
     @classmethod
@@ -50,7 +215,7 @@ class Account(models.Model):
         cls,
         maker: User,
         owner: User,
-        balance: float,
+        balance: Decimal,
         branch: Branch,
         account_type: Type,
     ):
@@ -59,21 +224,22 @@ class Account(models.Model):
         if Profile.has_admin_role(maker) or Profile.has_staff_role(maker):
 
             # generate account number
-            last_account_number = cls.objects.filter(branch=branch).count() + 1
+            last_account_number = BranchSequence.next_value(branch)
 
             account_number = (
                 branch.branch_id + account_type + str(last_account_number).zfill(9)
             )
 
-            account = cls.objects.create(
-                account_number=account_number,
-                owner=owner,
-                balance=balance,
-                branch=branch,
-                account_type=account_type,
-            )
+            with use_shard(shard_for_branch(branch.branch_id)):
+                account = cls.objects.create(
+                    account_number=account_number,
+                    owner=owner,
+                    balance=balance,
+                    branch=branch,
+                    account_type=account_type,
+                )
 
-            account.set_log(f"create account by {maker}")
+                account.set_log(f"create account by {maker}")
 
             return account
 
@@ -91,6 +257,36 @@ class Account(models.Model):
 
         return None
 
+    @classmethod
+    def activate_many(cls, account_numbers: Iterable[str], maker: User):
+        """
+        Activate many accounts with one UPDATE and return them.
+
+        Call it inside ``account_log_batch()`` so their logs are inserted in
+        bulk too.
+        """
+        from common.models import Profile
+
+        if not (Profile.has_admin_role(maker) or Profile.has_staff_role(maker)):
+            return []
+
+        accounts = list(
+            lock_rows(cls.objects)
+            .filter(account_number__in=account_numbers)
+            .exclude(status=cls.Status.ACTIVE)
+            .order_by("id")
+        )
+        cls.objects.filter(pk__in=[account.pk for account in accounts]).update(
+            status=cls.Status.ACTIVE, update_at=timezone.now()
+        )
+
+        for account in accounts:
+            account.status = cls.Status.ACTIVE
+            account.set_log(f"activate account by {maker}")
+        bump_summary_version(account.owner_id for account in accounts)
+
+        return accounts
+
     def deactivate(self, maker: User):
         from common.models import Profile
 
@@ -107,10 +303,187 @@ class Account(models.Model):
 
         return None
 
-    def deposit(self, amount: float, maker: User, set_log: bool = True):
-        self.balance = float(self.balance) + amount
+    @classmethod
+    def apply_balance_deltas(cls, deltas: dict[int, Decimal]) -> dict[int, Decimal]:
+        """
+        Add a delta to the balance of each account in one conditional UPDATE.
+
+        A row only changes while the account is active and its new balance
+        still covers its held amount, so the overdraft check runs in the
+        database and the row locks are held for this one statement. Returns the new balance of
+        every updated account; refused accounts are missing from the result,
+        and the caller must roll back if it needs all of them.
+        """
+        connection = connections[router.db_for_write(cls)]
+        table = connection.ops.quote_name(cls._meta.db_table)
+        pks = list(deltas)
+
+        case = "CASE id " + " ".join("WHEN %s THEN %s" for _ in pks) + " END"
+        case_params = [value for pk in pks for value in (pk, deltas[pk])]
+        placeholders = ", ".join("%s" for _ in pks)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET balance = balance + {case}, update_at = %s"
+                f" WHERE id IN ({placeholders}) AND status = %s"
+                f" AND balance - held_balance + {case} >= 0"
+                " RETURNING id, balance",
+                [
+                    *case_params,
+                    timezone.now(),
+                    *pks,
+                    cls.Status.ACTIVE,
+                    *case_params,
+                ],
+            )
+            return dict(cursor.fetchall())
+
+    def apply_balance_delta(self, delta: Decimal, shard: int = None) -> bool:
+        """
+        Add ``delta`` to this account's balance, False when refused.
+
+        ``shard`` picks the row of a sharded account, see ``pick_shard``.
+        """
+        if self.is_sharded:
+            applied = self.apply_shard_delta(delta, shard)
+        else:
+            balances = self.apply_balance_deltas({self.pk: delta})
+            applied = self.pk in balances
+            if applied:
+                self.balance = balances[self.pk]
+
+        if applied:
+            bump_summary_version([self.owner_id])
+        return applied
+
+    def pick_shard(self) -> int:
+        """Random balance row of the account, 0 being the account row."""
+        return random.randrange(self.balance_shards)
+
+    def apply_shard_delta(self, delta: Decimal, shard: int = None) -> bool:
+        """
+        Add ``delta`` to one shard of a sharded account, randomly picked unless
+        given.
+
+        Shard 0 is the account row itself. A withdrawal the picked shard cannot
+        cover falls back to ``rebalance_shards``, which checks the total.
+        """
+        if shard is None:
+            shard = self.pick_shard()
+        if shard == 0:
+            balances = self.apply_balance_deltas({self.pk: delta})
+            applied = self.pk in balances
+            if applied:
+                self.balance = balances[self.pk]
+        else:
+            applied = AccountBalanceShard.apply_delta(self, shard, delta)
+
+        if applied or delta >= 0:
+            return applied
+
+        return self.rebalance_shards(delta)
+
+    def reserve(self, amount: Decimal) -> bool:
+        """
+        Add ``amount`` to the held balance with one conditional UPDATE, False
+        when the available balance cannot cover it.
+
+        Holds are always reserved on the account row. A sharded account whose
+        row is short falls back to ``rebalance_shards``.
+        """
+        connection = connections[router.db_for_write(Account, instance=self)]
+        table = connection.ops.quote_name(self._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET held_balance = held_balance + %s, update_at = %s"
+                " WHERE id = %s AND status = %s AND balance - held_balance >= %s"
+                " RETURNING held_balance",
+                [amount, timezone.now(), self.pk, self.Status.ACTIVE, amount],
+            )
+            row = cursor.fetchone()
+
+        if row:
+            self.held_balance = row[0]
+            applied = True
+        else:
+            applied = self.is_sharded and self.rebalance_shards(hold=amount)
+
+        if applied:
+            bump_summary_version([self.owner_id])
+        return applied
+
+    def rebalance_shards(
+        self, delta: Decimal = Decimal("0"), hold: Decimal = Decimal("0")
+    ) -> bool:
+        """
+        Apply ``delta`` and a new ``hold`` against the total of all shards and
+        spread the result evenly over them again.
+
+        Locks the account row and every shard, so it is only used when a single
+        shard cannot cover a withdrawal or a hold. Returns False if the total
+        cannot.
+        """
+        with transaction.atomic(using=router.db_for_write(Account), savepoint=False):
+            account = lock_rows(Account.objects).filter(pk=self.pk).first()
+            if not account or not account.is_active:
+                return False
+
+            shards = list(lock_rows(account.shards.order_by("shard")))
+            total = account.balance + sum(shard.balance for shard in shards) + delta
+            held_balance = account.held_balance + hold
+            if total - held_balance < 0:
+                return False
+
+            balances = split_balance(total, len(shards) + 1, held_balance)
+            for shard, balance in zip(shards, balances[1:]):
+                shard.balance = balance
+
+            Account.objects.filter(pk=self.pk).update(
+                balance=balances[0],
+                held_balance=held_balance,
+                update_at=timezone.now(),
+            )
+            AccountBalanceShard.objects.bulk_update(shards, ["balance"])
+
+        self.balance = balances[0]
+        self.held_balance = held_balance
+        return True
+
+    def set_balance_shards(self, count: int):
+        """
+        Spread the balance of the account over ``count`` rows, or merge it back
+        into the account row with ``count=1``.
+        """
+        if count < 1:
+            raise Exception("Invalid shard count")
+
+        with transaction.atomic(using=router.db_for_write(Account), savepoint=False):
+            account = lock_rows(Account.objects).get(pk=self.pk)
+            shards = list(lock_rows(account.shards.order_by("shard")))
+            total = account.balance + sum(shard.balance for shard in shards)
+
+            balances = split_balance(total, count, account.held_balance)
+            account.shards.all().delete()
+            AccountBalanceShard.objects.bulk_create(
+                AccountBalanceShard(account=account, shard=shard, balance=balance)
+                for shard, balance in enumerate(balances)
+                if shard > 0
+            )
+            Account.objects.filter(pk=self.pk).update(
+                balance=balances[0], balance_shards=count, update_at=timezone.now()
+            )
+
+        self.balance = balances[0]
+        self.balance_shards = count
+
+    def deposit(self, amount: Decimal, maker: User, set_log: bool = True):
+
+        if amount <= 0:
+            raise Exception("Invalid amount")
+
+        if not self.apply_balance_delta(amount):
+            raise Exception("Cannot deposit")
 
-        self.save()
         if set_log:
             Transaction.objects.create(
                 account=self,
@@ -120,18 +493,14 @@ class Account(models.Model):
                 maker=maker,
             )
 
-    def withdraw(self, amount: float, maker: User, set_log: bool = True):
+    def withdraw(self, amount: Decimal, maker: User, set_log: bool = True):
 
-        if amount < 0:
+        if amount <= 0:
             raise Exception("Invalid amount")
 
-        new_balance = float(self.balance) - amount
-        if new_balance < 0:
+        if not self.apply_balance_delta(-amount):
             raise Exception("Cannot withdraw")
 
-        self.balance = new_balance
-
-        self.save()
         if set_log:
             Transaction.objects.create(
                 account=self,
@@ -141,19 +510,257 @@ class Account(models.Model):
                 maker=maker,
             )
 
-    def transfer(self, amount: float, receiver_account: "Account", maker: User):
+    def transfer(self, amount: Decimal, receiver_account: "Account", maker: User):
+        """
+        Move ``amount`` to ``receiver_account`` as one journal entry.
 
-        self.withdraw(amount, maker, set_log=False)
-        Transaction.objects.create(
-            account=self,
-            transaction_type=Transaction.Type.TRANSFER,
-            amount=amount,
-            message="Complete Transfer",
-            transfer_to=receiver_account,
-            maker=maker,
+        Both balances change in a single UPDATE and both legs of the entry are
+        written with one bulk insert.
+        """
+        if amount <= 0:
+            raise Exception("Invalid amount")
+
+        # no savepoint: a refused transfer rolls back the caller's transaction
+        with transaction.atomic(using=router.db_for_write(Account), savepoint=False):
+            if self.is_sharded or receiver_account.is_sharded:
+                # both rows are picked first and updated in (account id, shard)
+                # order, so opposite transfers cannot lock them crosswise
+                legs = sorted(
+                    [
+                        (self, self.pick_shard(), -amount),
+                        (receiver_account, receiver_account.pick_shard(), amount),
+                    ],
+                    key=lambda leg: (leg[0].pk, leg[1]),
+                )
+                for account, shard, delta in legs:
+                    if account.apply_balance_delta(delta, shard):
+                        continue
+                    if account is self:
+                        raise Exception("Cannot withdraw")
+                    raise Exception("Invalid receiver account")
+
+            else:
+                balances = self.apply_balance_deltas(
+                    {self.pk: -amount, receiver_account.pk: amount}
+                )
+                if self.pk not in balances:
+                    raise Exception("Cannot withdraw")
+                if receiver_account.pk not in balances:
+                    raise Exception("Invalid receiver account")
+
+                self.balance = balances[self.pk]
+                receiver_account.balance = balances[receiver_account.pk]
+                bump_summary_version([self.owner_id, receiver_account.owner_id])
+
+            entry = JournalEntry.objects.create(
+                entry_type=Transaction.Type.TRANSFER, amount=amount, maker=maker
+            )
+            Transaction.objects.bulk_create(
+                JournalEntry.transfer_legs(entry, self, receiver_account)
+            )
+
+        return entry
+
+    def balance_as_of(self, moment: datetime.datetime):
+        """
+        Balance of the account at ``moment``, or None if it did not exist yet.
+
+        Starts from the latest daily snapshot closed before ``moment`` and adds
+        the transactions since then. Without a snapshot, walks back from the
+        current balance instead.
+        """
+        if moment < self.create_at:
+            return None
+
+        snapshot = (
+            self.daily_balances.filter(date__lt=timezone.localdate(moment))
+            .order_by("-date")
+            .first()
         )
+        if snapshot:
+            since = date_start(snapshot.date + datetime.timedelta(days=1))
+            movement = Transaction.net_amount(
+                self.transactions.filter(create_at__gte=since, create_at__lt=moment)
+            )
+            return snapshot.closing_balance + movement
+
+        movement = Transaction.net_amount(
+            self.transactions.filter(create_at__gte=moment)
+        )
+        return self.total_balance - movement
+
+    @classmethod
+    def post_batch(cls, postings: list[dict], maker: User):
+        """
+        Apply deposit, withdraw and transfer postings in one go.
 
-        receiver_account.deposit(amount, maker)
+        Must be called inside ``transaction.atomic``. Every account touched by
+        the batch is locked once, in primary key order, so concurrent batches
+        cannot deadlock each other. Returns the balance of every account by
+        number.
+        """
+        account_numbers = set()
+        for posting in postings:
+            account_numbers.add(posting["account_number"])
+            if posting.get("receiver_account_number"):
+                account_numbers.add(posting["receiver_account_number"])
+
+        accounts = {
+            account.account_number: account
+            for account in lock_rows(cls.objects)
+            .filter(account_number__in=account_numbers)
+            .order_by("id")
+        }
+
+        # sharded accounts are posted against their total and split again below
+        shards = list(
+            lock_rows(AccountBalanceShard.objects)
+            .filter(account__in=[a for a in accounts.values() if a.is_sharded])
+            .order_by("account_id", "shard")
+        )
+        accounts_by_pk = {account.pk: account for account in accounts.values()}
+        for shard in shards:
+            accounts_by_pk[shard.account_id].balance += shard.balance
+
+        transactions = []
+        entries = []
+        touched = {}
+        for index, posting in enumerate(postings):
+            account = accounts.get(posting["account_number"])
+            if not account or not account.is_active:
+                raise Exception(f"Invalid account at posting {index}")
+
+            amount = posting["amount"]
+            transaction_type = posting["transaction_type"]
+
+            if transaction_type == Transaction.Type.DEPOSIT:
+                account.balance += amount
+                transactions.append(
+                    Transaction(
+                        account=account,
+                        transaction_type=Transaction.Type.DEPOSIT,
+                        amount=amount,
+                        message="Complete Deposit",
+                        maker=maker,
+                    )
+                )
+
+            elif transaction_type == Transaction.Type.WITHDRAW:
+                if account.balance - account.held_balance < amount:
+                    raise Exception(f"Cannot withdraw at posting {index}")
+                account.balance -= amount
+                transactions.append(
+                    Transaction(
+                        account=account,
+                        transaction_type=Transaction.Type.WITHDRAW,
+                        amount=amount,
+                        message="Complete Withdraw",
+                        maker=maker,
+                    )
+                )
+
+            elif transaction_type == Transaction.Type.TRANSFER:
+                receiver_account = accounts.get(posting["receiver_account_number"])
+                if not receiver_account or not receiver_account.is_active:
+                    raise Exception(f"Invalid receiver account at posting {index}")
+                if account.balance - account.held_balance < amount:
+                    raise Exception(f"Cannot withdraw at posting {index}")
+                account.balance -= amount
+                receiver_account.balance += amount
+                touched[receiver_account.pk] = receiver_account
+                entries.append(
+                    (
+                        JournalEntry(
+                            entry_type=Transaction.Type.TRANSFER,
+                            amount=amount,
+                            maker=maker,
+                        ),
+                        account,
+                        receiver_account,
+                    )
+                )
+
+            touched[account.pk] = account
+
+        totals = {
+            account_number: account.balance
+            for account_number, account in accounts.items()
+        }
+
+        for account in accounts_by_pk.values():
+            if account.is_sharded:
+                account_shards = [s for s in shards if s.account_id == account.pk]
+                balances = split_balance(
+                    account.balance, len(account_shards) + 1, account.held_balance
+                )
+                account.balance = balances[0]
+                for shard, balance in zip(account_shards, balances[1:]):
+                    shard.balance = balance
+
+        # bulk_update skips auto_now, so stamp update_at ourselves
+        update_at = timezone.now()
+        for account in touched.values():
+            account.update_at = update_at
+
+        cls.objects.bulk_update(touched.values(), ["balance", "update_at"])
+        bump_summary_version(account.owner_id for account in touched.values())
+        AccountBalanceShard.objects.bulk_update(shards, ["balance"])
+
+        JournalEntry.objects.bulk_create([entry for entry, _, _ in entries])
+        for entry, sender, receiver in entries:
+            transactions.extend(JournalEntry.transfer_legs(entry, sender, receiver))
+        Transaction.objects.bulk_create(transactions)
+
+        return totals
+
+
+def split_balance(
+    total: Decimal, parts: int, held: Decimal = Decimal("0")
+) -> list[Decimal]:
+    """
+    Split ``total`` into ``parts`` even amounts. The remainder and the
+    ``held`` amount stay in the first part, the account row.
+    """
+    share = ((total - held) / parts).quantize(Decimal("0.01"), rounding=ROUND_DOWN)
+    return [total - share * (parts - 1)] + [share] * (parts - 1)
+
+
+class AccountBalanceShard(models.Model):
+    """
+    Part of the balance of a hot account.
+
+    An account with ``balance_shards = N`` keeps shard 0 in ``Account.balance``
+    and shards 1..N-1 here, so concurrent postings can update different rows.
+    """
+
+    account = models.ForeignKey(
+        Account, on_delete=models.CASCADE, related_name="shards"
+    )
+    shard = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=21, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "shard"], name="account_balance_shard_unique"
+            ),
+        ]
+
+    @classmethod
+    def apply_delta(cls, account: Account, shard: int, delta: Decimal) -> bool:
+        """Same rules as ``Account.apply_balance_deltas``, for one shard row."""
+        connection = connections[router.db_for_write(cls)]
+        table = connection.ops.quote_name(cls._meta.db_table)
+        account_table = connection.ops.quote_name(Account._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET balance = balance + %s"
+                " WHERE account_id = %s AND shard = %s AND balance + %s >= 0"
+                f" AND EXISTS (SELECT 1 FROM {account_table}"
+                " WHERE id = %s AND status = %s)",
+                [delta, account.pk, shard, delta, account.pk, Account.Status.ACTIVE],
+            )
+            return cursor.rowcount == 1
 
 
 class AccountLog(models.Model):
@@ -178,6 +785,574 @@ class Transaction(models.Model):
     transfer_to = models.ForeignKey(
         Account, on_delete=models.PROTECT, null=True, blank=True
     )
+    transfer_from = models.ForeignKey(
+        Account,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    entry = models.ForeignKey(
+        "JournalEntry",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="legs",
+    )
+
+    maker = models.ForeignKey(User, on_delete=models.CASCADE)
+    create_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def signed_amount(cls):
+        """Balance movement of a row: deposits add, withdrawals and transfers subtract."""
+        return Case(
+            When(transaction_type=cls.Type.DEPOSIT, then=F("amount")),
+            default=F("amount") * -1,
+            output_field=models.DecimalField(max_digits=21, decimal_places=2),
+        )
+
+    @classmethod
+    def net_amount(cls, queryset) -> Decimal:
+        total = queryset.aggregate(total=Sum(cls.signed_amount()))["total"]
+        return total or Decimal("0")
+
+    @classmethod
+    def net_amount_subquery(cls, **filters):
+        """Per-account net movement, to annotate onto ``Account`` querysets."""
+        movement = (
+            cls.objects.filter(account=OuterRef("pk"), **filters)
+            .values("account")
+            .annotate(total=Sum(cls.signed_amount()))
+            .values("total")
+        )
+        return Coalesce(
+            Subquery(movement), Decimal("0"), output_field=models.DecimalField()
+        )
+
+    class Meta:
+        indexes = [
+            # statement lookups and keyset pagination
+            models.Index(
+                fields=["account", "create_at", "id"],
+                name="transaction_statement_idx",
+            ),
+        ]
+
+
+class JournalEntry(models.Model):
+    """
+    A posting that moves money between accounts.
+
+    Each entry has one ``Transaction`` leg per account it touches, and every
+    leg carries its counterparty so statements never need to join the other
+    side.
+    """
+
+    entry_type = models.CharField(choices=Transaction.Type)
+    amount = models.DecimalField(max_digits=21, decimal_places=2)
+    maker = models.ForeignKey(User, on_delete=models.CASCADE)
+    create_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Journal entry ({self.pk})"
+
+    @staticmethod
+    def transfer_legs(entry: "JournalEntry", sender: Account, receiver: Account):
+        return [
+            Transaction(
+                account=sender,
+                transaction_type=Transaction.Type.TRANSFER,
+                amount=entry.amount,
+                message="Complete Transfer",
+                transfer_to=receiver,
+                maker_id=entry.maker_id,
+                entry=entry,
+            ),
+            Transaction(
+                account=receiver,
+                transaction_type=Transaction.Type.DEPOSIT,
+                amount=entry.amount,
+                message="Complete Deposit",
+                transfer_from=sender,
+                maker_id=entry.maker_id,
+                entry=entry,
+            ),
+        ]
+
+
+class Hold(models.Model):
+    """
+    Funds reserved for a withdraw or transfer that is settled later.
+
+    Authorizing only bumps ``Account.held_balance`` in one short statement.
+    Authorized holds are captured in batches by ``capture_batch``, which
+    writes the transactions and moves the balances of a whole batch at once.
+    """
+
+    class Status(models.TextChoices):
+        AUTHORIZED = "AUTHORIZED", _("AUTHORIZED")
+        CAPTURED = "CAPTURED", _("CAPTURED")
+        RELEASED = "RELEASED", _("RELEASED")
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="holds")
+    receiver_account = models.ForeignKey(
+        Account,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    amount = models.DecimalField(max_digits=21, decimal_places=2)
+    status = models.CharField(choices=Status, default=Status.AUTHORIZED)
+    entry = models.ForeignKey(
+        JournalEntry, on_delete=models.PROTECT, null=True, blank=True
+    )
+    maker = models.ForeignKey(User, on_delete=models.CASCADE)
+    create_at = models.DateTimeField(auto_now_add=True)
+    update_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # capture and expiry scans
+            models.Index(fields=["status", "create_at"], name="hold_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"Hold ({self.pk})"
+
+    @property
+    def transaction_type(self):
+        if self.receiver_account_id:
+            return Transaction.Type.TRANSFER
+        return Transaction.Type.WITHDRAW
+
+    @classmethod
+    def authorize(
+        cls,
+        account: Account,
+        amount: Decimal,
+        maker: User,
+        receiver_account: Account = None,
+    ) -> "Hold":
+        if amount <= 0:
+            raise Exception("Invalid amount")
+
+        # no savepoint: a refused hold rolls back the caller's transaction
+        with transaction.atomic(using=router.db_for_write(Account), savepoint=False):
+            if not account.reserve(amount):
+                raise Exception("Cannot withdraw")
+
+            return cls.objects.create(
+                account=account,
+                receiver_account=receiver_account,
+                amount=amount,
+                maker=maker,
+            )
+
+    @classmethod
+    def pending(cls, hold_ids: Iterable[int] = None):
+        """Authorized holds, locked and skipping those another batch holds."""
+        holds = (
+            cls.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(status=cls.Status.AUTHORIZED)
+            # cross-shard transfers settle their own holds
+            .filter(cross_shard_transfer__isnull=True)
+            .select_related("account", "receiver_account")
+            .order_by("id")
+        )
+        if hold_ids is not None:
+            holds = holds.filter(pk__in=hold_ids)
+        return holds
+
+    @classmethod
+    def capture_batch(
+        cls, hold_ids: Iterable[int] = None, batch_size: int = None
+    ) -> tuple[int, int]:
+        """
+        Capture up to ``batch_size`` authorized holds in one transaction.
+
+        Every account of the batch is locked once, in primary key order, and
+        updated by a single UPDATE. A transfer whose receiver was closed after
+        the authorization is released instead. Returns the number of captured
+        and released holds.
+        """
+        batch_size = batch_size or settings.HOLD_CAPTURE_BATCH_SIZE
+
+        # no savepoint: a refused capture rolls back the caller's transaction
+        with transaction.atomic(using=router.db_for_write(cls), savepoint=False):
+            holds = list(cls.pending(hold_ids)[:batch_size])
+
+            account_ids = {hold.account_id for hold in holds} | {
+                hold.receiver_account_id for hold in holds if hold.receiver_account_id
+            }
+            # the receiver status is read again under its row lock
+            accounts = {
+                account.pk: account
+                for account in lock_rows(Account.objects)
+                .filter(pk__in=account_ids)
+                .order_by("id")
+            }
+
+            captured = [
+                hold
+                for hold in holds
+                if not hold.receiver_account_id
+                or accounts[hold.receiver_account_id].is_active
+            ]
+            captured_ids = {hold.pk for hold in captured}
+            released = [hold for hold in holds if hold.pk not in captured_ids]
+
+            cls._capture(captured)
+            cls._release(released)
+
+        return len(captured), len(released)
+
+    @classmethod
+    def release_batch(
+        cls, hold_ids: Iterable[int] = None, before: datetime.datetime = None
+    ) -> int:
+        """Release authorized holds by id, or those authorized before ``before``."""
+        with transaction.atomic(using=router.db_for_write(cls)):
+            holds = cls.pending(hold_ids)
+            if before:
+                holds = holds.filter(create_at__lt=before)
+            holds = list(holds)
+
+            cls._release(holds)
+
+        return len(holds)
+
+    @classmethod
+    def _capture(cls, holds: list["Hold"]):
+        if not holds:
+            return
+
+        held = {}
+        credited = {}
+        transactions = []
+        entries = []
+        for hold in holds:
+            held[hold.account_id] = held.get(hold.account_id, 0) + hold.amount
+
+            if hold.receiver_account_id:
+                credited[hold.receiver_account_id] = (
+                    credited.get(hold.receiver_account_id, 0) + hold.amount
+                )
+                hold.entry = JournalEntry(
+                    entry_type=Transaction.Type.TRANSFER,
+                    amount=hold.amount,
+                    maker_id=hold.maker_id,
+                )
+                entries.append(hold)
+            else:
+                transactions.append(
+                    Transaction(
+                        account_id=hold.account_id,
+                        transaction_type=Transaction.Type.WITHDRAW,
+                        amount=hold.amount,
+                        message="Complete Withdraw",
+                        maker_id=hold.maker_id,
+                    )
+                )
+
+        # the held amount is still on the account row, so the balance can
+        # drop with it; receivers are credited on their row as well
+        Account.objects.filter(pk__in=held.keys() | credited.keys()).update(
+            balance=F("balance") + _delta_case(credited) - _delta_case(held),
+            held_balance=F("held_balance") - _delta_case(held),
+            update_at=timezone.now(),
+        )
+
+        JournalEntry.objects.bulk_create([hold.entry for hold in entries])
+        for hold in entries:
+            transactions.extend(
+                JournalEntry.transfer_legs(
+                    hold.entry, hold.account, hold.receiver_account
+                )
+            )
+        Transaction.objects.bulk_create(transactions)
+
+        bump_summary_version(
+            account.owner_id
+            for hold in holds
+            for account in (hold.account, hold.receiver_account)
+            if account
+        )
+        cls._set_status(holds, cls.Status.CAPTURED)
 
+    @classmethod
+    def _release(cls, holds: list["Hold"]):
+        if not holds:
+            return
+
+        held = {}
+        for hold in holds:
+            held[hold.account_id] = held.get(hold.account_id, 0) + hold.amount
+
+        Account.objects.filter(pk__in=held.keys()).update(
+            held_balance=F("held_balance") - _delta_case(held),
+            update_at=timezone.now(),
+        )
+        bump_summary_version(hold.account.owner_id for hold in holds)
+
+        cls._set_status(holds, cls.Status.RELEASED)
+
+    @classmethod
+    def _set_status(cls, holds: list["Hold"], status: Status):
+        # bulk_update skips auto_now, so stamp update_at ourselves
+        update_at = timezone.now()
+        for hold in holds:
+            hold.status = status
+            hold.update_at = update_at
+
+        cls.objects.bulk_update(holds, ["status", "entry", "update_at"])
+
+
+class CrossShardTransfer(models.Model):
+    """
+    One side of a transfer between accounts stored on different shards.
+
+    No transaction can span two databases, so the transfer runs in two
+    steps, each one local transaction:
+
+    1. ``prepare`` holds the amount on the sender's shard and records the
+       OUT side as PREPARED.
+    2. ``settle`` credits the receiver on its shard and records the IN side
+       under the same ``transfer_id``, so crediting twice is impossible. Then
+       it captures the hold and marks the OUT side COMPLETED, or releases the
+       hold and marks it FAILED when the receiver refused the credit.
+
+    A transfer interrupted between the steps stays PREPARED until
+    ``settle-cross-shard-transfers`` finishes it.
+    """
+
+    class Direction(models.TextChoices):
+        OUT = "OUT", _("OUT")
+        IN = "IN", _("IN")
+
+    class Status(models.TextChoices):
+        PREPARED = "PREPARED", _("PREPARED")
+        COMPLETED = "COMPLETED", _("COMPLETED")
+        FAILED = "FAILED", _("FAILED")
+
+    transfer_id = models.UUIDField(default=uuid.uuid4)
+    direction = models.CharField(choices=Direction)
+    account = models.ForeignKey(
+        Account, on_delete=models.CASCADE, related_name="cross_shard_transfers"
+    )
+    counterparty_account_number = models.CharField(max_length=16)
+    amount = models.DecimalField(max_digits=21, decimal_places=2)
+    hold = models.OneToOneField(
+        Hold,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="cross_shard_transfer",
+    )
+    status = models.CharField(choices=Status, default=Status.PREPARED)
     maker = models.ForeignKey(User, on_delete=models.CASCADE)
     create_at = models.DateTimeField(auto_now_add=True)
+    update_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["transfer_id", "direction"],
+                name="cross_shard_transfer_side_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Cross-shard transfer ({self.transfer_id} {self.direction})"
+
+    @classmethod
+    def prepare(
+        cls,
+        account: Account,
+        receiver_account_number: str,
+        amount: Decimal,
+        maker: User,
+    ) -> "CrossShardTransfer":
+        """Step 1, on the sender's shard: hold ``amount`` on ``account``."""
+        with transaction.atomic(using=router.db_for_write(cls), savepoint=False):
+            hold = Hold.authorize(account=account, amount=amount, maker=maker)
+            return cls.objects.create(
+                direction=cls.Direction.OUT,
+                account=account,
+                counterparty_account_number=receiver_account_number,
+                amount=amount,
+                hold=hold,
+                maker=maker,
+            )
+
+    def settle(self) -> bool:
+        """Step 2 of a prepared OUT side. True when the transfer completed."""
+        credited = self.credit()
+
+        with use_shard(self._state.db) as db, transaction.atomic(using=db):
+            transfer = (
+                CrossShardTransfer.objects.select_for_update(of=("self",))
+                .select_related("account", "hold")
+                .get(pk=self.pk)
+            )
+            if transfer.status == self.Status.PREPARED:
+                if credited:
+                    transfer._capture()
+                else:
+                    Hold._release([transfer.hold])
+                    transfer.status = self.Status.FAILED
+                    transfer.save(update_fields=["status", "update_at"])
+
+        self.status = transfer.status
+        return self.status == self.Status.COMPLETED
+
+    def credit(self) -> bool:
+        """
+        Credit the receiver once, on its shard. False when refused.
+
+        An IN side already recorded for the transfer means it was credited,
+        and only a transfer never credited can still be refused.
+        """
+        receiver_db = shard_for_account_number(self.counterparty_account_number)
+
+        with use_shard(receiver_db):
+            # a retry of a credit that committed before a crash succeeds even
+            # if the receiver was closed since, or the money would be doubled
+            if CrossShardTransfer.objects.filter(
+                transfer_id=self.transfer_id, direction=self.Direction.IN
+            ).exists():
+                return True
+
+            receiver_account = Account.objects.filter(
+                account_number=self.counterparty_account_number
+            ).last()
+            if not receiver_account or not receiver_account.is_active:
+                return False
+
+            try:
+                with transaction.atomic(using=receiver_db):
+                    # unique per transfer, a second credit stops here
+                    CrossShardTransfer.objects.create(
+                        transfer_id=self.transfer_id,
+                        direction=self.Direction.IN,
+                        account=receiver_account,
+                        counterparty_account_number=self.account.account_number,
+                        amount=self.amount,
+                        status=self.Status.COMPLETED,
+                        maker_id=self.maker_id,
+                    )
+                    if not receiver_account.apply_balance_delta(self.amount):
+                        transaction.set_rollback(True, using=receiver_db)
+                        return False
+
+                    Transaction.objects.create(
+                        account=receiver_account,
+                        transaction_type=Transaction.Type.DEPOSIT,
+                        amount=self.amount,
+                        message=f"Complete Deposit from {self.account.account_number}",
+                        maker_id=self.maker_id,
+                    )
+            except IntegrityError:
+                # credited by an earlier attempt
+                pass
+
+        return True
+
+    def _capture(self):
+        Account.objects.filter(pk=self.account_id).update(
+            balance=F("balance") - self.amount,
+            held_balance=F("held_balance") - self.amount,
+            update_at=timezone.now(),
+        )
+        Transaction.objects.create(
+            account_id=self.account_id,
+            transaction_type=Transaction.Type.TRANSFER,
+            amount=self.amount,
+            message=f"Complete Transfer to {self.counterparty_account_number}",
+            maker_id=self.maker_id,
+        )
+        Hold._set_status([self.hold], Hold.Status.CAPTURED)
+        bump_summary_version([self.account.owner_id])
+
+        self.status = self.Status.COMPLETED
+        self.save(update_fields=["status", "update_at"])
+
+
+def _delta_case(deltas: dict[int, Decimal]):
+    """Per-account amount for an ``Account`` update, zero for other rows."""
+    return Case(
+        *[When(pk=pk, then=Value(amount)) for pk, amount in deltas.items()],
+        default=Value(Decimal("0")),
+        output_field=models.DecimalField(max_digits=21, decimal_places=2),
+    )
+
+
+class DailyBalance(models.Model):
+    """Closing balance of an account at the end of a day."""
+
+    account = models.ForeignKey(
+        Account, on_delete=models.CASCADE, related_name="daily_balances"
+    )
+    date = models.DateField()
+    closing_balance = models.DecimalField(max_digits=21, decimal_places=2)
+    create_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "date"], name="daily_balance_account_date_unique"
+            ),
+        ]
+
+    @classmethod
+    def snapshot(cls, date: datetime.date, batch_size: int = 1000) -> int:
+        """
+        Store the closing balance of every account for ``date``.
+
+        The closing balance is the current balance minus everything posted
+        after that day, read in one statement so that concurrent postings are
+        either fully included or fully excluded. Existing snapshots for the
+        day are overwritten. Returns the number of rows written.
+        """
+        day_end = date_start(date + datetime.timedelta(days=1))
+        accounts = (
+            Account.objects.filter(create_at__lt=day_end)
+            .annotate(
+                later=Transaction.net_amount_subquery(create_at__gte=day_end),
+                shard_balance=Account.shard_balance_subquery(),
+            )
+            .values_list("id", "balance", "shard_balance", "later")
+            .order_by("id")
+        )
+
+        count = 0
+        batch = []
+        for account_id, balance, shard_balance, later in accounts.iterator(
+            chunk_size=batch_size
+        ):
+            batch.append(
+                cls(
+                    account_id=account_id,
+                    date=date,
+                    closing_balance=balance + shard_balance - later,
+                )
+            )
+            if len(batch) >= batch_size:
+                count += cls._write(batch)
+                batch = []
+
+        if batch:
+            count += cls._write(batch)
+
+        return count
+
+    @classmethod
+    def _write(cls, batch):
+        cls.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["account", "date"],
+            update_fields=["closing_balance"],
+        )
+        return len(batch)
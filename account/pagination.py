@@ -0,0 +1,100 @@
+import base64
+import datetime
+
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class StatementCursorPagination(BasePagination):
+    """
+    Keyset pagination for statements, ordered by ``(create_at, id)``.
+
+    The cursor holds the key of the last row of the page and the next page
+    starts right after it, so the database seeks straight to the position
+    through the ``(account, create_at, id)`` index instead of skipping rows
+    like an OFFSET would.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by("create_at", "id")
+
+        position = self.decode_cursor(request)
+        if position:
+            create_at, pk = position
+            queryset = queryset.filter(create_at__gte=create_at).exclude(
+                create_at=create_at, id__lte=pk
+            )
+
+        rows = list(queryset[: self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+
+        self.next_position = None
+        if self.has_next:
+            self.next_position = self.get_position(rows[-1])
+
+        return rows
+
+    def get_position(self, row):
+        # rows are model instances, or named rows on the lean read path
+        return row.create_at, row.id
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode("ascii")).decode("ascii")
+            create_at, pk = decoded.split("|")
+            return datetime.datetime.fromisoformat(create_at), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound("Invalid cursor")
+
+    def encode_cursor(self, position):
+        create_at, pk = position
+        raw = f"{create_at.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii")
+
+    def get_next_link(self):
+        if not self.next_position:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
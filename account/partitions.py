@@ -0,0 +1,162 @@
+"""
+Monthly range partitions of the ``account_transaction`` table (PostgreSQL only).
+
+The table is partitioned by ``create_at`` in migration 0006. Each month lives in
+``account_transaction_pYYYYMM`` and rows outside every monthly partition fall
+into ``account_transaction_default``, until the partition of their month is
+created and takes them over.
+
+Everything runs on the shard selected with ``use_shard()``.
+"""
+
+import datetime
+
+from dateutil.relativedelta import relativedelta
+from django.db import connections, transaction
+
+from account.models import Transaction
+from core.db_routers import account_db
+
+PARENT_TABLE = Transaction._meta.db_table
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+
+def month_start(value: datetime.date) -> datetime.date:
+    return value.replace(day=1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"{PARENT_TABLE}_p{month:%Y%m}"
+
+
+def get_connection():
+    return connections[account_db()]
+
+
+def is_partitioned() -> bool:
+    connection = get_connection()
+    if connection.vendor != "postgresql":
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p"
+            " JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+            [PARENT_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions() -> list[str]:
+    with get_connection().cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits"
+            " JOIN pg_class parent ON parent.oid = pg_inherits.inhparent"
+            " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+            " WHERE parent.relname = %s ORDER BY child.relname",
+            [PARENT_TABLE],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def month_bounds(month: datetime.date) -> list[str]:
+    """``[start, end)`` of the partition of ``month``, in UTC."""
+    return [
+        f"{month:%Y-%m-%d} 00:00:00+00",
+        f"{month + relativedelta(months=1):%Y-%m-%d} 00:00:00+00",
+    ]
+
+
+def create_partition(month: datetime.date) -> bool:
+    """
+    Create the partition of ``month`` if missing. Returns True when created.
+
+    PostgreSQL refuses to create it while the default partition holds rows of
+    that month (back-dated rows, or a month the command did not create in
+    time). The default is then detached, the month created, its rows moved
+    over and the default attached again, all in one transaction.
+    """
+    month = month_start(month)
+    name = partition_name(month)
+    if name in list_partitions():
+        return False
+
+    connection = get_connection()
+    quote = connection.ops.quote_name
+    bounds = month_bounds(month)
+    columns = ", ".join(
+        quote(field.column) for field in Transaction._meta.concrete_fields
+    )
+    in_month = f"{quote('create_at')} >= %s AND {quote('create_at')} < %s"
+
+    with transaction.atomic(using=account_db()), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {quote(DEFAULT_PARTITION)}"
+            f" WHERE {in_month})",
+            bounds,
+        )
+        misplaced = cursor.fetchone()[0]
+
+        if misplaced:
+            # the table cannot be altered with foreign key checks pending
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute(
+                f"ALTER TABLE {quote(PARENT_TABLE)}"
+                f" DETACH PARTITION {quote(DEFAULT_PARTITION)}"
+            )
+
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} PARTITION OF {quote(PARENT_TABLE)}"
+            " FOR VALUES FROM (%s) TO (%s)",
+            bounds,
+        )
+
+        if misplaced:
+            cursor.execute(
+                f"INSERT INTO {quote(name)} ({columns})"
+                f" SELECT {columns} FROM {quote(DEFAULT_PARTITION)} WHERE {in_month}",
+                bounds,
+            )
+            cursor.execute(
+                f"DELETE FROM {quote(DEFAULT_PARTITION)} WHERE {in_month}", bounds
+            )
+            cursor.execute(
+                f"ALTER TABLE {quote(PARENT_TABLE)}"
+                f" ATTACH PARTITION {quote(DEFAULT_PARTITION)} DEFAULT"
+            )
+            # back to Django's INITIALLY DEFERRED foreign keys
+            cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+    return True
+
+
+def create_partitions(first: datetime.date, last: datetime.date) -> list[str]:
+    """Create the missing partitions from ``first`` to ``last`` month, included."""
+    created = []
+    month = month_start(first)
+    while month <= last:
+        if create_partition(month):
+            created.append(partition_name(month))
+        month += relativedelta(months=1)
+    return created
+
+
+def detach_partition(month: datetime.date, drop: bool = False) -> bool:
+    """
+    Detach the partition of ``month`` from the table, dropping it if asked.
+
+    A detached partition stays in the database as a plain table that can be
+    archived and dropped later. Returns True when a partition was detached.
+    """
+    name = partition_name(month_start(month))
+    if name not in list_partitions():
+        return False
+
+    connection = get_connection()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE {quote(PARENT_TABLE)} DETACH PARTITION {quote(name)}"
+        )
+        if drop:
+            cursor.execute(f"DROP TABLE {quote(name)}")
+    return True
@@ -0,0 +1,83 @@
+"""
+Lean read path for statements and account summaries.
+
+Rows are fetched with ``values_list()`` (only the columns that are shown) and
+turned into the same dicts ``AccountTransactionSerializer`` and
+``CustomerInquirySerializer`` produce, without going through serializer
+fields for every row. Enabled with ``ACCOUNT_LEAN_READS``.
+"""
+
+from django.utils import timezone
+
+from account.exports import STATEMENT_EXPORT_COLUMNS, STATEMENT_EXPORT_FIELDS
+from account.models import Account
+from core.db_routers import shard_aliases, use_shard
+
+
+def statement_values(transactions):
+    """``values_list()`` queryset of a statement, in export column order."""
+    # named rows, the cursor pagination reads row.create_at and row.id
+    return transactions.values_list("id", *STATEMENT_EXPORT_FIELDS, named=True)
+
+
+def format_datetime(value, tz) -> str:
+    """ISO 8601 in ``tz``, the way ``serializers.DateTimeField`` writes it."""
+    value = value.astimezone(tz).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def statement_data(rows) -> list[dict]:
+    tz = timezone.get_current_timezone()
+    data = []
+    for row in rows:
+        # id is needed by the cursor pagination only
+        item = dict(zip(STATEMENT_EXPORT_COLUMNS, row[1:]))
+        item["create_at"] = format_datetime(item["create_at"], tz)
+        data.append(item)
+    return data
+
+
+def account_summary_data(user) -> dict:
+    data = []
+    # a customer may own accounts in branches on different shards
+    for alias in shard_aliases():
+        with use_shard(alias):
+            accounts = list(
+                Account.objects.filter(owner=user)
+                .annotate(shard_balance=Account.shard_balance_subquery())
+                .values_list(
+                    "account_type",
+                    "account_number",
+                    "branch_id",
+                    "status",
+                    "balance",
+                    "shard_balance",
+                    "held_balance",
+                )
+                .order_by("id")
+            )
+
+        for (
+            account_type,
+            account_number,
+            branch_id,
+            status,
+            balance,
+            shard_balance,
+            held_balance,
+        ) in accounts:
+            total_balance = balance + shard_balance
+            data.append(
+                {
+                    "account_type": account_type,
+                    "account_number": account_number,
+                    "branch": branch_id,
+                    "status": status,
+                    "balance": total_balance,
+                    "available_balance": total_balance - held_balance,
+                }
+            )
+
+    return {"username": user.username, "accounts": data}
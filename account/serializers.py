@@ -1,7 +1,8 @@
+from django.conf import settings
 from django.forms import ValidationError
 from rest_framework import serializers
 
-from account.models import Account, Branch, Transaction
+from account.models import Account, Branch, Hold, Transaction
 
 
 class AccountTransactionSerializer(serializers.ModelSerializer):
@@ -13,12 +14,18 @@ class AccountTransactionSerializer(serializers.ModelSerializer):
             "amount",
             "message",
             "transfer_to",
+            "transfer_from",
             "create_at",
         ]
 
 
 class CustomerAccountDetailSerializer(serializers.ModelSerializer):
-    balance = serializers.DecimalField(decimal_places=2, max_digits=20, read_only=True)
+    balance = serializers.DecimalField(
+        source="total_balance", decimal_places=2, max_digits=20, read_only=True
+    )
+    available_balance = serializers.DecimalField(
+        decimal_places=2, max_digits=20, read_only=True
+    )
 
     class Meta:
         model = Account
@@ -28,6 +35,7 @@ class CustomerAccountDetailSerializer(serializers.ModelSerializer):
             "branch",
             "status",
             "balance",
+            "available_balance",
         ]
 
 
@@ -83,3 +91,73 @@ class TransactionMakerSerializer(serializers.Serializer):
         if value <= 0:
             raise ValidationError("balance must be greater than 0")
         return value
+
+
+class PostingSerializer(serializers.Serializer):
+    account_number = serializers.CharField(required=True)
+    transaction_type = serializers.ChoiceField(choices=Transaction.Type.choices)
+    amount = serializers.DecimalField(
+        max_digits=8, decimal_places=2, coerce_to_string=False
+    )
+    receiver_account_number = serializers.CharField(
+        required=False, allow_blank=True, allow_null=True
+    )
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise ValidationError("amount must be greater than 0")
+        return value
+
+    def validate(self, attrs):
+        if attrs["transaction_type"] == Transaction.Type.TRANSFER:
+            receiver_account_number = attrs.get("receiver_account_number")
+            if not receiver_account_number:
+                raise ValidationError("transfer require receiver_account_number")
+            if receiver_account_number == attrs["account_number"]:
+                raise ValidationError("cannot transfer to the same account")
+        return attrs
+
+
+class BulkPostingSerializer(serializers.Serializer):
+    postings = PostingSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=settings.BULK_POSTING_MAX_SIZE,
+    )
+
+
+class HoldSerializer(serializers.ModelSerializer):
+    account_number = serializers.CharField(source="account.account_number")
+    receiver_account_number = serializers.CharField(
+        source="receiver_account.account_number", allow_null=True
+    )
+
+    class Meta:
+        model = Hold
+        read_only_fields = fields = [
+            "id",
+            "account_number",
+            "receiver_account_number",
+            "amount",
+            "status",
+            "create_at",
+        ]
+
+
+class HoldIdsSerializer(serializers.Serializer):
+    hold_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False,
+        max_length=settings.HOLD_CAPTURE_BATCH_SIZE,
+    )
+    # shard of the holds, required with hold_ids when accounts are sharded
+    branch_id = serializers.CharField(required=False)
+
+
+class AccountNumbersSerializer(serializers.Serializer):
+    account_numbers = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=settings.BULK_POSTING_MAX_SIZE,
+    )
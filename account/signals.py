@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from account.cache import bump_summary_version
+from account.models import Account
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def clear_account_summary_cache(sender, instance: Account, **kwargs):
+    bump_summary_version([instance.owner_id])
@@ -1,3 +1,1350 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import (
+    IntegrityError,
+    OperationalError,
+    connection,
+    connections,
+    transaction,
+)
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from account import models, partitions
+from account.audit import account_log_batch
+from account.cache import (
+    bump_summary_version,
+    get_account_summary,
+    get_summary_version,
+    summary_version_key,
+)
+from account.models import (
+    Account,
+    AccountLog,
+    Branch,
+    BranchSequence,
+    CrossShardTransfer,
+    DailyBalance,
+    Hold,
+    Transaction,
+)
+from common.helpers import create_user
+from common.metrics import get_endpoint_stats, measure
+from common.testing import assert_query_budget
+from core import db_routers
+from core.db_routers import shard_aliases, shard_for_account_number
+from common.models import Profile
+from utils.db_utils import get_conflict_stats, retry_on_conflict
+
+PASSWORD = "11test2@Pass04"
+
+
+class AccountTestMixin:
+    # users and branches are copied to the shards, when there are any
+    databases = "__all__"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(branch_id="00001", branch_name="Test")
+        cls.staff = create_user(
+            username="test-staff", password=PASSWORD, role=Profile.Role.STAFF
+        )
+        cls.customer = create_user(
+            username="test-customer", password=PASSWORD, role=Profile.Role.CUSTOMER
+        )
+
+    def create_account(
+        self, balance="100.00", status=Account.Status.ACTIVE, owner=None
+    ):
+        account = Account.create_account(
+            maker=self.staff,
+            owner=owner or self.customer,
+            balance=Decimal(balance),
+            branch=self.branch,
+            account_type=Account.Type.SAVING,
+        )
+        Account.objects.filter(pk=account.pk).update(status=status)
+        account.status = status
+        return account
+
+    def create_transactions(self, account, amounts, create_at=None):
+        """Deposits for positive ``amounts``, withdrawals for negative ones."""
+        transactions = []
+        for amount in map(Decimal, amounts):
+            transactions.append(
+                Transaction(
+                    account=account,
+                    transaction_type=(
+                        Transaction.Type.DEPOSIT
+                        if amount > 0
+                        else Transaction.Type.WITHDRAW
+                    ),
+                    amount=abs(amount),
+                    maker=self.staff,
+                )
+            )
+        Transaction.objects.bulk_create(transactions)
+
+        if create_at:
+            Transaction.objects.filter(pk__in=[row.pk for row in transactions]).update(
+                create_at=create_at
+            )
+        return transactions
+
+    def customer_client(self):
+        client = APIClient()
+        client.force_login(self.customer)
+        return client
+
+
+class AccountTestCase(AccountTestMixin, TestCase):
+    pass
+
+
+class BalanceDeltaTests(AccountTestCase):
+
+    def test_deposit_and_withdraw(self):
+        account = self.create_account("100.00")
+
+        self.assertTrue(account.apply_balance_delta(Decimal("50.00")))
+        self.assertTrue(account.apply_balance_delta(Decimal("-150.00")))
+
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal("0.00"))
+
+    def test_overdraft_is_refused(self):
+        account = self.create_account("100.00")
+
+        self.assertFalse(account.apply_balance_delta(Decimal("-100.01")))
+
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal("100.00"))
+
+    def test_held_balance_is_not_available(self):
+        account = self.create_account("100.00")
+        Account.objects.filter(pk=account.pk).update(held_balance=Decimal("60.00"))
+
+        self.assertFalse(account.apply_balance_delta(Decimal("-50.00")))
+        self.assertTrue(account.apply_balance_delta(Decimal("-40.00")))
+
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal("60.00"))
+
+    def test_inactive_account_is_refused(self):
+        for status in (Account.Status.INACTIVE, Account.Status.WAIT_ACTIVATE):
+            account = self.create_account("100.00", status=status)
+
+            self.assertFalse(account.apply_balance_delta(Decimal("10.00")))
+            self.assertFalse(account.apply_balance_delta(Decimal("-10.00")))
+
+            account.refresh_from_db()
+            self.assertEqual(account.balance, Decimal("100.00"))
+
+    def test_deposit_raises_when_refused(self):
+        account = self.create_account("100.00", status=Account.Status.INACTIVE)
+
+        with self.assertRaisesMessage(Exception, "Cannot deposit"):
+            account.deposit(Decimal("10.00"), maker=self.staff)
+        self.assertFalse(account.transactions.exists())
+
+
+class StatementPaginationTests(AccountTestCase):
+
+    def test_rows_sharing_create_at_are_paged_once(self):
+        account = self.create_account()
+        amounts = [str(amount) for amount in range(1, 8)]
+        self.create_transactions(
+            account, amounts, create_at=timezone.now().replace(microsecond=0)
+        )
+
+        client = self.customer_client()
+        url = f"/api/account/financial/{account.account_number}/statement/?page_size=3"
+        seen = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["results"]), 3)
+            seen += [row["amount"] for row in response.data["results"]]
+            url = response.data["next"]
+
+        # ties on create_at are ordered by id, in insertion order
+        self.assertEqual(seen, [Decimal(amount) for amount in amounts])
+
+    def test_balances_are_sent_with_the_first_page(self):
+        account = self.create_account("10.00")
+        Account.objects.filter(pk=account.pk).update(
+            create_at=timezone.now() - datetime.timedelta(days=2)
+        )
+        self.create_transactions(account, ["1.00", "2.00", "3.00"])
+
+        client = self.customer_client()
+        response = client.get(
+            f"/api/account/financial/{account.account_number}/statement/",
+            {"page_size": 2, "start_date": timezone.localdate().isoformat()},
+        )
+        self.assertEqual(response.data["opening_balance"], Decimal("4.00"))
+        self.assertEqual(response.data["closing_balance"], Decimal("10.00"))
+
+        with mock.patch.object(Account, "balance_as_of") as balance_as_of:
+            response = client.get(response.data["next"])
+        balance_as_of.assert_not_called()
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertNotIn("opening_balance", response.data)
+
+    def test_invalid_cursor(self):
+        account = self.create_account()
+        response = self.customer_client().get(
+            f"/api/account/financial/{account.account_number}/statement/?cursor=x"
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class StatementRangeTests(AccountTestCase):
+
+    def setUp(self):
+        self.account = self.create_account()
+        self.client = self.customer_client()
+
+    def get(self, action, start_date, end_date="2025-12-31"):
+        return self.client.get(
+            f"/api/account/financial/{self.account.account_number}/{action}/",
+            {"start_date": start_date, "end_date": end_date},
+        )
+
+    def test_invalid_range_is_a_bad_request(self):
+        for start_date in ("2025-13-01", "2026-01-01"):
+            self.assertEqual(self.get("statement", start_date).status_code, 400)
+
+    @override_settings(STATEMENT_MAX_RANGE_DAYS=366)
+    def test_only_statements_are_limited(self):
+        self.assertEqual(self.get("statement", "2025-01-01").status_code, 200)
+        self.assertEqual(self.get("statement", "2024-12-30").status_code, 400)
+        self.assertEqual(self.get("export", "2020-01-01").status_code, 200)
+
+
+class ExportTests(AccountTestCase):
+
+    def setUp(self):
+        self.account = self.create_account()
+        self.client = self.customer_client()
+        moment = timezone.make_aware(datetime.datetime(2025, 3, 10, 12))
+        self.create_transactions(self.account, ["1.00"], create_at=moment)
+        # rows sharing create_at are written in id order
+        self.create_transactions(
+            self.account,
+            ["2.00", "-3.00"],
+            create_at=moment - datetime.timedelta(days=400),
+        )
+        self.create_transactions(
+            self.account, ["4.00"], create_at=moment + datetime.timedelta(days=400)
+        )
+
+    def export(self, **params):
+        response = self.client.get(
+            f"/api/account/financial/{self.account.account_number}/export/",
+            {"start_date": "2024-01-01", "end_date": "2025-12-31", **params},
+        )
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        lines = self.export(file_format="csv").splitlines()
+        self.assertEqual(
+            lines[0],
+            "transaction_type,amount,message,transfer_to,transfer_from,create_at",
+        )
+        self.assertEqual(
+            [line.split(",")[:2] for line in lines[1:]],
+            [["D", "2.00"], ["W", "3.00"], ["D", "1.00"]],
+        )
+
+    def test_ndjson_over_more_than_a_year(self):
+        rows = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual([row["amount"] for row in rows], ["2.00", "3.00", "1.00"])
+        self.assertEqual(rows[0]["create_at"][:10], "2024-02-04")
+
+        rows = self.export(start_date="2025-01-01").splitlines()
+        self.assertEqual([json.loads(row)["amount"] for row in rows], ["1.00"])
+
+    def test_rows_are_read_from_the_replica_while_streaming(self):
+        used_replica = []
+
+        def db_for_read(router, model, **hints):
+            if model is Transaction:
+                used_replica.append(db_routers._use_replica.get())
+            return "default"
+
+        with mock.patch.object(
+            db_routers.ReplicaRouter, "db_for_read", autospec=True
+        ) as spy:
+            spy.side_effect = db_for_read
+            self.export()
+        self.assertTrue(used_replica)
+        self.assertTrue(all(used_replica))
+
+
+class BalanceAsOfTests(AccountTestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.account = self.create_account("120.00")
+        Account.objects.filter(pk=self.account.pk).update(create_at=self.days_ago(10))
+        self.account.refresh_from_db()
+
+        # opened with 100.00, then +50.00 and -30.00
+        self.create_transactions(self.account, ["50.00"], create_at=self.days_ago(5))
+        self.create_transactions(self.account, ["-30.00"], create_at=self.days_ago(2))
+
+    def days_ago(self, days):
+        return self.now - datetime.timedelta(days=days)
+
+    def test_before_opening(self):
+        self.assertIsNone(self.account.balance_as_of(self.days_ago(11)))
+
+    def test_without_snapshot(self):
+        self.assertEqual(self.account.balance_as_of(self.days_ago(7)), Decimal("100"))
+        self.assertEqual(self.account.balance_as_of(self.days_ago(3)), Decimal("150"))
+        self.assertEqual(self.account.balance_as_of(self.now), Decimal("120"))
+
+    def test_from_snapshot(self):
+        date = timezone.localdate(self.days_ago(4))
+        self.assertEqual(DailyBalance.snapshot(date), 1)
+
+        snapshot = self.account.daily_balances.get(date=date)
+        self.assertEqual(snapshot.closing_balance, Decimal("150"))
+
+        # later days start from the snapshot, not from the current balance
+        snapshot.closing_balance = Decimal("1000")
+        snapshot.save()
+        self.assertEqual(self.account.balance_as_of(self.days_ago(1)), Decimal("970"))
+        self.assertEqual(self.account.balance_as_of(self.days_ago(7)), Decimal("100"))
+
+
+class PartitionTests(AccountTestCase):
+
+    def partition_of(self, row):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tableoid::regclass::text FROM account_transaction"
+                " WHERE id = %s",
+                [row.pk],
+            )
+            return cursor.fetchone()[0]
+
+    def test_create_partition_takes_rows_from_default(self):
+        account = self.create_account()
+        month = datetime.date(2001, 2, 1)
+        transactions = self.create_transactions(
+            account,
+            ["10.00", "20.00"],
+            create_at=datetime.datetime(2001, 2, 14, tzinfo=datetime.timezone.utc),
+        )
+        later = self.create_transactions(
+            account,
+            ["30.00"],
+            create_at=datetime.datetime(2001, 3, 1, tzinfo=datetime.timezone.utc),
+        )
+        self.assertEqual(
+            self.partition_of(transactions[0]), partitions.DEFAULT_PARTITION
+        )
+
+        self.assertTrue(partitions.create_partition(month))
+        self.assertFalse(partitions.create_partition(month))
+
+        for row in transactions:
+            self.assertEqual(self.partition_of(row), partitions.partition_name(month))
+        self.assertEqual(self.partition_of(later[0]), partitions.DEFAULT_PARTITION)
+        self.assertIn(partitions.DEFAULT_PARTITION, partitions.list_partitions())
+        self.assertEqual(account.transactions.count(), 3)
+
+    def test_create_partitions(self):
+        created = partitions.create_partitions(
+            datetime.date(2001, 11, 15), datetime.date(2002, 1, 1)
+        )
+        self.assertEqual(
+            created,
+            [
+                "account_transaction_p200111",
+                "account_transaction_p200112",
+                "account_transaction_p200201",
+            ],
+        )
+
+
+class BalanceShardTests(AccountTestCase):
+
+    def setUp(self):
+        self.sender = self.create_account("1000.00")
+        self.receiver = self.create_account("1000.00")
+        self.sender.set_balance_shards(4)
+        self.receiver.set_balance_shards(4)
+
+    def total(self, account):
+        account = Account.objects.get(pk=account.pk)
+        return account.total_balance
+
+    def test_transfer_updates_rows_in_account_and_shard_order(self):
+        calls = []
+        apply_balance_delta = Account.apply_balance_delta
+
+        def record(account, delta, shard=None):
+            calls.append((account.pk, shard))
+            return apply_balance_delta(account, delta, shard)
+
+        with mock.patch.object(Account, "apply_balance_delta", record):
+            for _ in range(5):
+                self.sender.transfer(Decimal("10.00"), self.receiver, self.staff)
+                self.receiver.transfer(Decimal("4.00"), self.sender, self.staff)
+
+        for index in range(0, len(calls), 2):
+            self.assertEqual(calls[index : index + 2], sorted(calls[index : index + 2]))
+            self.assertEqual(calls[index][0], self.sender.pk)
+
+        self.assertEqual(self.total(self.sender), Decimal("970.00"))
+        self.assertEqual(self.total(self.receiver), Decimal("1030.00"))
+
+    def test_refused_withdrawal_rolls_back_the_credit(self):
+        # a refused transfer rolls back the caller's transaction
+        with self.assertRaisesMessage(Exception, "Cannot withdraw"):
+            with transaction.atomic():
+                self.receiver.transfer(Decimal("5000.00"), self.sender, self.staff)
+
+        self.assertEqual(self.total(self.sender), Decimal("1000.00"))
+        self.assertEqual(self.total(self.receiver), Decimal("1000.00"))
+
+    @override_settings(ACCOUNT_LEAN_READS=False)
+    def test_summary_reads_shards_without_n_plus_one(self):
+        for _ in range(3):
+            self.create_account("50.00").set_balance_shards(3)
+
+        # the account state, the accounts and all their shards, whatever the
+        # number of accounts
+        with self.assertNumQueries(3):
+            data = get_account_summary(self.customer, request=None)
+
+        balances = sorted(account["balance"] for account in data["accounts"])
+        self.assertEqual(
+            balances,
+            [Decimal("50.00")] * 3 + [Decimal("1000.00")] * 2,
+        )
+
+
+class HoldTests(AccountTestCase):
+
+    def setUp(self):
+        self.account = self.create_account("100.00")
+        self.receiver = self.create_account("0.00")
+
+    def balances(self, account):
+        account.refresh_from_db()
+        return account.balance, account.held_balance
+
+    def test_authorize_reserves_the_available_balance(self):
+        Hold.authorize(self.account, Decimal("60.00"), maker=self.staff)
+
+        self.assertEqual(self.balances(self.account), (Decimal("100"), Decimal("60")))
+        with self.assertRaisesMessage(Exception, "Cannot withdraw"):
+            with transaction.atomic():
+                Hold.authorize(self.account, Decimal("50.00"), maker=self.staff)
+        self.assertFalse(self.account.apply_balance_delta(Decimal("-50.00")))
+
+    def test_capture_withdraw_and_transfer(self):
+        withdraw = Hold.authorize(self.account, Decimal("30.00"), maker=self.staff)
+        transfer = Hold.authorize(
+            self.account,
+            Decimal("20.00"),
+            maker=self.staff,
+            receiver_account=self.receiver,
+        )
+
+        self.assertEqual(Hold.capture_batch(), (2, 0))
+
+        self.assertEqual(self.balances(self.account), (Decimal("50"), Decimal("0")))
+        self.assertEqual(self.balances(self.receiver), (Decimal("20"), Decimal("0")))
+        for hold in (withdraw, transfer):
+            hold.refresh_from_db()
+            self.assertEqual(hold.status, Hold.Status.CAPTURED)
+        self.assertEqual(
+            sorted(transfer.entry.legs.values_list("account_id", "transaction_type")),
+            sorted(
+                [
+                    (self.account.pk, Transaction.Type.TRANSFER),
+                    (self.receiver.pk, Transaction.Type.DEPOSIT),
+                ]
+            ),
+        )
+        self.assertEqual(self.account.transactions.count(), 2)
+        # captured holds are not captured again
+        self.assertEqual(Hold.capture_batch(), (0, 0))
+
+    def test_transfer_to_closed_receiver_is_released(self):
+        hold = Hold.authorize(
+            self.account,
+            Decimal("20.00"),
+            maker=self.staff,
+            receiver_account=self.receiver,
+        )
+        Account.objects.filter(pk=self.receiver.pk).update(
+            status=Account.Status.INACTIVE
+        )
+
+        self.assertEqual(Hold.capture_batch(), (0, 1))
+
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, Hold.Status.RELEASED)
+        self.assertEqual(self.balances(self.account), (Decimal("100"), Decimal("0")))
+        self.assertEqual(self.balances(self.receiver), (Decimal("0"), Decimal("0")))
+
+    def test_receiver_closed_during_capture_is_released(self):
+        hold = Hold.authorize(
+            self.account,
+            Decimal("20.00"),
+            maker=self.staff,
+            receiver_account=self.receiver,
+        )
+        # read while the receiver was still active
+        pending = list(Hold.pending())
+        Account.objects.filter(pk=self.receiver.pk).update(
+            status=Account.Status.INACTIVE
+        )
+
+        with mock.patch.object(Hold, "pending", return_value=pending):
+            self.assertEqual(Hold.capture_batch(), (0, 1))
+
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, Hold.Status.RELEASED)
+        self.assertEqual(self.balances(self.receiver), (Decimal("0"), Decimal("0")))
+
+    def test_release(self):
+        first = Hold.authorize(self.account, Decimal("30.00"), maker=self.staff)
+        second = Hold.authorize(self.account, Decimal("20.00"), maker=self.staff)
+
+        self.assertEqual(Hold.release_batch(hold_ids=[first.pk]), 1)
+        self.assertEqual(self.balances(self.account), (Decimal("100"), Decimal("20")))
+
+        Hold.objects.filter(pk=second.pk).update(
+            create_at=timezone.now() - datetime.timedelta(days=30)
+        )
+        self.assertEqual(Hold.release_batch(before=timezone.now()), 1)
+        self.assertEqual(self.balances(self.account), (Decimal("100"), Decimal("0")))
+        self.assertFalse(self.account.transactions.exists())
+
+    def test_invalid_hold_id_is_a_bad_request(self):
+        client = APIClient()
+        client.force_login(self.staff)
+
+        for action in ("capture_holds", "release_holds"):
+            response = client.post(
+                f"/api/account/customer/{action}/",
+                {"hold_ids": ["x", 2], "branch_id": self.branch.branch_id},
+                format="json",
+            )
+            self.assertEqual(response.status_code, 400)
+            # errors of list items are keyed by their index
+            self.assertIn("0", response.json()["hold_ids"])
+
+
+class PostBatchTests(AccountTestCase):
+
+    def setUp(self):
+        self.account = self.create_account("100.00")
+        self.receiver = self.create_account("5.00")
+
+    def postings(self, *postings):
+        return [
+            {
+                "account_number": self.account.account_number,
+                "amount": Decimal(amount),
+                "transaction_type": transaction_type,
+                **extra,
+            }
+            for transaction_type, amount, extra in postings
+        ]
+
+    def assert_untouched(self):
+        for account, balance in ((self.account, "100.00"), (self.receiver, "5.00")):
+            account.refresh_from_db()
+            self.assertEqual(account.balance, Decimal(balance))
+        self.assertFalse(
+            Transaction.objects.filter(
+                account__in=[self.account, self.receiver]
+            ).exists()
+        )
+
+    def test_failed_posting_rolls_back_the_batch(self):
+        postings = self.postings(
+            (Transaction.Type.DEPOSIT, "10.00", {}),
+            (
+                Transaction.Type.TRANSFER,
+                "20.00",
+                {"receiver_account_number": self.receiver.account_number},
+            ),
+            # more than is left after the postings above
+            (Transaction.Type.WITHDRAW, "95.00", {}),
+        )
+
+        with self.assertRaisesMessage(Exception, "Cannot withdraw at posting 2"):
+            with transaction.atomic():
+                Account.post_batch(postings, maker=self.staff)
+
+        self.assert_untouched()
+
+    def test_failed_posting_is_rejected_by_the_view(self):
+        Account.objects.filter(pk=self.receiver.pk).update(
+            status=Account.Status.INACTIVE
+        )
+        client = APIClient()
+        client.force_login(self.staff)
+
+        response = client.post(
+            "/api/account/customer/postings/",
+            {
+                "postings": [
+                    {
+                        "account_number": self.account.account_number,
+                        "transaction_type": Transaction.Type.DEPOSIT,
+                        "amount": "10.00",
+                    },
+                    {
+                        "account_number": self.account.account_number,
+                        "transaction_type": Transaction.Type.TRANSFER,
+                        "amount": "20.00",
+                        "receiver_account_number": self.receiver.account_number,
+                    },
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("posting 1", response.json()["detail"])
+        self.assert_untouched()
+
+
+class AccountLogBatchTests(AccountTestCase):
+
+    def setUp(self):
+        self.account = self.create_account(status=Account.Status.WAIT_ACTIVATE)
+
+    def messages(self):
+        return list(
+            AccountLog.objects.filter(account=self.account)
+            .exclude(message__startswith="create account")
+            .order_by("id")
+            .values_list("message", flat=True)
+        )
+
+    def test_logs_are_written_in_bulk(self):
+        with account_log_batch(batch_size=2, flush_interval=60):
+            for index in range(3):
+                self.account.set_log(f"log {index}")
+            # the first two were flushed once the batch was full
+            self.assertEqual(self.messages(), ["log 0", "log 1"])
+
+        self.assertEqual(self.messages(), ["log 0", "log 1", "log 2"])
+
+    def test_nested_batch_rolled_back_drops_its_logs(self):
+        with account_log_batch(flush_interval=60):
+            self.account.set_log("outer")
+            try:
+                with account_log_batch():
+                    self.account.activate(maker=self.staff)
+                    raise ValueError()
+            except ValueError:
+                pass
+
+            with account_log_batch():
+                self.account.set_log("inner")
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.status, Account.Status.WAIT_ACTIVATE)
+        self.assertEqual(self.messages(), ["outer", "inner"])
+
+    def test_nested_batch_marked_for_rollback_drops_its_logs(self):
+        with account_log_batch(flush_interval=60):
+            with account_log_batch():
+                self.account.set_log("inner")
+                transaction.set_rollback(True)
+
+        self.assertEqual(self.messages(), [])
+
+
+class ConditionalGetTests(AccountTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.account = self.create_account("100.00")
+        self.client = self.customer_client()
+
+    def test_account_summary(self):
+        url = "/api/account/financial/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.account.deposit(Decimal("10.00"), maker=self.staff)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["accounts"][0]["balance"], Decimal("110.00"))
+
+    def test_account_summary_without_version_bump(self):
+        url = "/api/account/financial/"
+        etag = self.client.get(url)["ETag"]
+
+        # another worker's change, its version bump never reaches this cache
+        self.account.deposit(Decimal("10.00"), maker=self.staff)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["accounts"][0]["balance"], Decimal("110.00"))
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    )
+    def test_account_summary_without_cache(self):
+        url = "/api/account/financial/"
+        etag = self.client.get(url)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.account.withdraw(Decimal("10.00"), maker=self.staff)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["accounts"][0]["balance"], Decimal("90.00"))
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304
+        )
+
+    @override_settings(ACCOUNT_SUMMARY_CACHE_TIMEOUT=60)
+    def test_summary_version_expires_with_the_summary(self):
+        # a bump missed by another worker's cache lasts one timeout at most
+        key = summary_version_key(self.customer.pk)
+        with mock.patch.object(cache, "add", wraps=cache.add) as add:
+            get_summary_version(self.customer.pk)
+        add.assert_called_once_with(key, mock.ANY, 60)
+
+        cache.delete(key)
+        with mock.patch.object(cache, "set", wraps=cache.set) as set_:
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_summary_version([self.customer.pk])
+        set_.assert_called_once_with(key, mock.ANY, 60)
+
+    def test_statement(self):
+        url = f"/api/account/financial/{self.account.account_number}/statement/"
+        self.account.deposit(Decimal("10.00"), maker=self.staff)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.account.withdraw(Decimal("5.00"), maker=self.staff)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 2)
+
+
+class LeanReadTests(AccountTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.account = self.create_account("100.00")
+        self.receiver = self.create_account("5.00")
+        self.account.set_balance_shards(2)
+        self.account.deposit(Decimal("10.25"), maker=self.staff)
+        self.account.transfer(Decimal("7.50"), self.receiver, maker=self.staff)
+        self.receiver.transfer(Decimal("1.10"), self.account, maker=self.staff)
+        self.client = self.customer_client()
+
+    def get_both(self, url):
+        responses = []
+        for lean in (True, False):
+            cache.clear()
+            with override_settings(ACCOUNT_LEAN_READS=lean):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            responses.append(response.content)
+        return responses
+
+    def test_statement_matches_serializer(self):
+        for account in (self.account, self.receiver):
+            lean, serializer = self.get_both(
+                f"/api/account/financial/{account.account_number}/statement/"
+                "?page_size=2"
+            )
+            self.assertEqual(lean, serializer)
+
+    def test_account_summary_matches_serializer(self):
+        lean, serializer = self.get_both("/api/account/financial/")
+        self.assertEqual(lean, serializer)
+
+
+class QueryBudgetTests(AccountTestMixin, TransactionTestCase):
+    # outside of a test transaction, atomic blocks add no SAVEPOINT queries;
+    # QUERY_BUDGETS count the session and user lookups of a logged in client
+
+    def setUp(self):
+        cache.clear()
+        self.setUpTestData()
+        self.account = self.create_account("100.00")
+        self.receiver = self.create_account("5.00")
+        self.create_transactions(self.account, ["10.00", "-5.00"])
+        self.staff_client = APIClient()
+        self.staff_client.force_login(self.staff)
+
+    def assert_budget(self, endpoint, client, method, url, data=None, status=200):
+        with assert_query_budget(endpoint):
+            if data is None:
+                response = getattr(client, method)(url)
+            else:
+                response = getattr(client, method)(url, data, format="json")
+            if response.streaming:
+                # the export runs its queries while it is read
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_every_budget_is_tested(self):
+        tested = {
+            name.removeprefix("test_").replace("_", "-")
+            for name in dir(self)
+            if name.startswith("test_") and name != "test_every_budget_is_tested"
+        }
+        self.assertEqual(
+            tested,
+            {endpoint.split()[1] for endpoint in settings.QUERY_BUDGETS},
+        )
+
+    def test_customer_create_account(self):
+        self.assert_budget(
+            "POST customer-create-account",
+            self.staff_client,
+            "post",
+            "/api/account/customer/create_account/",
+            {
+                "username": self.customer.username,
+                "balance": "10.00",
+                "account_type": Account.Type.SAVING,
+                "branch_id": self.branch.pk,
+            },
+            status=201,
+        )
+
+    def test_customer_activate(self):
+        account = self.create_account(status=Account.Status.WAIT_ACTIVATE)
+        self.assert_budget(
+            "PUT customer-activate",
+            self.staff_client,
+            "put",
+            f"/api/account/customer/{account.account_number}/activate/",
+        )
+
+    def test_customer_activate_accounts(self):
+        accounts = [
+            self.create_account(status=Account.Status.WAIT_ACTIVATE) for _ in range(3)
+        ]
+        self.assert_budget(
+            "POST customer-activate-accounts",
+            self.staff_client,
+            "post",
+            "/api/account/customer/activate_accounts/",
+            {"account_numbers": [account.account_number for account in accounts]},
+        )
+
+    def test_customer_deactivate(self):
+        self.assert_budget(
+            "PUT customer-deactivate",
+            self.staff_client,
+            "put",
+            f"/api/account/customer/{self.account.account_number}/deactivate/",
+        )
+
+    def test_customer_deposit(self):
+        self.assert_budget(
+            "PUT customer-deposit",
+            self.staff_client,
+            "put",
+            f"/api/account/customer/{self.account.account_number}/deposit/",
+            {"amount": "10.00", "receiver_account_number": None},
+        )
+
+    def test_customer_withdraw(self):
+        self.assert_budget(
+            "PUT customer-withdraw",
+            self.staff_client,
+            "put",
+            f"/api/account/customer/{self.account.account_number}/withdraw/",
+            {"amount": "10.00", "receiver_account_number": None},
+        )
+
+    def test_customer_transfer(self):
+        self.assert_budget(
+            "PUT customer-transfer",
+            self.staff_client,
+            "put",
+            f"/api/account/customer/{self.account.account_number}/transfer/",
+            {
+                "amount": "10.00",
+                "receiver_account_number": self.receiver.account_number,
+            },
+        )
+
+    def test_customer_postings(self):
+        self.assert_budget(
+            "POST customer-postings",
+            self.staff_client,
+            "post",
+            "/api/account/customer/postings/",
+            {
+                "postings": [
+                    {
+                        "account_number": self.account.account_number,
+                        "transaction_type": Transaction.Type.DEPOSIT,
+                        "amount": "10.00",
+                    },
+                    {
+                        "account_number": self.account.account_number,
+                        "transaction_type": Transaction.Type.TRANSFER,
+                        "amount": "5.00",
+                        "receiver_account_number": self.receiver.account_number,
+                    },
+                ]
+            },
+            status=201,
+        )
+
+    def test_customer_hold(self):
+        self.assert_budget(
+            "PUT customer-hold",
+            self.staff_client,
+            "put",
+            f"/api/account/customer/{self.account.account_number}/hold/",
+            {
+                "amount": "10.00",
+                "receiver_account_number": self.receiver.account_number,
+            },
+            status=201,
+        )
+
+    def test_customer_capture_holds(self):
+        holds = [Hold.authorize(self.account, Decimal("10.00"), maker=self.staff)]
+        holds += [
+            Hold.authorize(
+                self.account,
+                Decimal("5.00"),
+                maker=self.staff,
+                receiver_account=self.receiver,
+            )
+            for _ in range(3)
+        ]
+        response = self.assert_budget(
+            "POST customer-capture-holds",
+            self.staff_client,
+            "post",
+            "/api/account/customer/capture_holds/",
+            {
+                "hold_ids": [hold.pk for hold in holds],
+                "branch_id": self.branch.branch_id,
+            },
+        )
+        self.assertEqual(response.data["captured"], 4)
+
+    def test_customer_release_holds(self):
+        hold = Hold.authorize(self.account, Decimal("10.00"), maker=self.staff)
+        response = self.assert_budget(
+            "POST customer-release-holds",
+            self.staff_client,
+            "post",
+            "/api/account/customer/release_holds/",
+            {"hold_ids": [hold.pk], "branch_id": self.branch.branch_id},
+        )
+        self.assertEqual(response.data["released"], 1)
+
+    def test_financial_list(self):
+        self.assert_budget(
+            "GET financial-list",
+            self.customer_client(),
+            "get",
+            "/api/account/financial/",
+        )
+
+    def test_financial_statement(self):
+        self.assert_budget(
+            "GET financial-statement",
+            self.customer_client(),
+            "get",
+            f"/api/account/financial/{self.account.account_number}/statement/",
+        )
+
+    def test_financial_balance(self):
+        self.assert_budget(
+            "GET financial-balance",
+            self.customer_client(),
+            "get",
+            f"/api/account/financial/{self.account.account_number}/balance/",
+        )
+
+    def test_financial_export(self):
+        endpoint = "GET financial-export"
+        client = self.customer_client()
+        before = get_endpoint_stats().get(endpoint, {"requests": 0, "queries": 0})
+        with measure() as metrics:
+            self.assert_budget(
+                endpoint,
+                client,
+                "get",
+                f"/api/account/financial/{self.account.account_number}/export/",
+            )
+
+        # the middleware counts the rows read while streaming as well
+        after = get_endpoint_stats()[endpoint]
+        self.assertEqual(after["requests"] - before["requests"], 1)
+        self.assertEqual(after["queries"] - before["queries"], metrics.queries)
+
+
+class LockPolicyTests(AccountTestMixin, TransactionTestCase):
+    # the row lock is held from a second connection, which only sees
+    # committed rows
+
+    def setUp(self):
+        self.setUpTestData()
+        self.account = self.create_account("100.00")
+        self.staff_client = APIClient()
+        self.staff_client.force_login(self.staff)
+
+    @contextmanager
+    def row_locked(self, account):
+        """Hold ``account``'s row lock from another connection."""
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic(using=account._state.db):
+                    Account.objects.using(account._state.db).select_for_update().get(
+                        pk=account.pk
+                    )
+                    locked.set()
+                    release.wait(timeout=10)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(timeout=10))
+            yield
+        finally:
+            release.set()
+            thread.join()
+
+    def post_deposit(self):
+        return self.staff_client.post(
+            "/api/account/customer/postings/",
+            {
+                "postings": [
+                    {
+                        "account_number": self.account.account_number,
+                        "transaction_type": Transaction.Type.DEPOSIT,
+                        "amount": "10.00",
+                    },
+                ]
+            },
+            format="json",
+        )
+
+    def assert_locked(self, response):
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            response["Retry-After"], str(settings.ACCOUNT_LOCK_RETRY_AFTER)
+        )
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal("100.00"))
+
+    @override_settings(ACCOUNT_LOCK_MODE="nowait")
+    def test_nowait_answers_conflict_on_locked_row(self):
+        before = get_conflict_stats().get("lock_not_available", 0)
+        with self.row_locked(self.account):
+            response = self.post_deposit()
+
+        self.assert_locked(response)
+        self.assertEqual(get_conflict_stats()["lock_not_available"] - before, 1)
+
+        # the row is free again
+        self.assertEqual(self.post_deposit().status_code, 201)
+
+    @override_settings(ACCOUNT_LOCK_MODE="timeout", ACCOUNT_LOCK_TIMEOUT_MS=50)
+    def test_lock_timeout_answers_conflict_on_locked_row(self):
+        with self.row_locked(self.account):
+            response = self.post_deposit()
+
+        self.assert_locked(response)
+
+
+class RetryOnConflictTests(SimpleTestCase):
+    # outside of any transaction, like a view wrapped in retry_on_conflict
+
+    class DatabaseError(Exception):
+        # stands in for the psycopg2 error Django chains as the cause
+        def __init__(self, pgcode):
+            super().__init__(pgcode)
+            self.pgcode = pgcode
+
+    def conflict(self, pgcode):
+        error = OperationalError()
+        error.__cause__ = self.DatabaseError(pgcode)
+        return error
+
+    def run_retried(self, side_effect):
+        func = mock.Mock(side_effect=side_effect, __name__="posting")
+        with mock.patch("utils.db_utils.time.sleep") as sleep:
+            try:
+                return func, sleep, retry_on_conflict(attempts=3)(func)()
+            except OperationalError as error:
+                return func, sleep, error
+
+    def test_deadlock_is_retried(self):
+        before = get_conflict_stats()
+        func, sleep, result = self.run_retried([self.conflict("40P01"), "done"])
+
+        self.assertEqual(result, "done")
+        self.assertEqual(func.call_count, 2)
+        self.assertEqual(sleep.call_count, 1)
+        after = get_conflict_stats()
+        self.assertEqual(after["deadlock"] - before.get("deadlock", 0), 1)
+        self.assertEqual(after.get("gave_up", 0), before.get("gave_up", 0))
+
+    def test_gives_up_after_the_last_attempt(self):
+        before = get_conflict_stats()
+        error = self.conflict("40001")
+        func, sleep, result = self.run_retried(error)
+
+        self.assertIs(result, error)
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+        after = get_conflict_stats()
+        self.assertEqual(
+            after["serialization_failure"] - before.get("serialization_failure", 0),
+            3,
+        )
+        self.assertEqual(after["gave_up"] - before.get("gave_up", 0), 1)
+
+    def test_other_errors_are_not_retried(self):
+        error = self.conflict("55P03")
+        func, sleep, result = self.run_retried(error)
+
+        self.assertIs(result, error)
+        self.assertEqual(func.call_count, 1)
+        sleep.assert_not_called()
+
+
+class CrossShardTransferTests(AccountTestCase):
+
+    def setUp(self):
+        self.account = self.create_account("100.00")
+        self.receiver = self.create_account("0.00")
+        self.transfer = CrossShardTransfer.prepare(
+            self.account,
+            self.receiver.account_number,
+            Decimal("40.00"),
+            maker=self.staff,
+        )
+
+    def balances(self, account):
+        account.refresh_from_db()
+        return account.balance, account.held_balance
+
+    def test_prepare_holds_the_amount(self):
+        self.assertEqual(self.transfer.status, CrossShardTransfer.Status.PREPARED)
+        self.assertEqual(self.balances(self.account), (Decimal("100"), Decimal("40")))
+
+    def test_settle(self):
+        self.assertTrue(self.transfer.settle())
+        # settling again changes nothing
+        self.assertTrue(self.transfer.settle())
+
+        self.assertEqual(self.balances(self.account), (Decimal("60"), Decimal("0")))
+        self.assertEqual(self.balances(self.receiver), (Decimal("40"), Decimal("0")))
+        self.assertEqual(self.receiver.transactions.count(), 1)
+        self.assertEqual(
+            Hold.objects.get(pk=self.transfer.hold_id).status, Hold.Status.CAPTURED
+        )
+
+    def test_refused_credit_releases_the_hold(self):
+        Account.objects.filter(pk=self.receiver.pk).update(
+            status=Account.Status.INACTIVE
+        )
+
+        self.assertFalse(self.transfer.settle())
+
+        self.transfer.refresh_from_db()
+        self.assertEqual(self.transfer.status, CrossShardTransfer.Status.FAILED)
+        self.assertEqual(self.balances(self.account), (Decimal("100"), Decimal("0")))
+        self.assertEqual(self.balances(self.receiver), (Decimal("0"), Decimal("0")))
+
+    def test_retry_after_crash_and_deactivation_completes(self):
+        # credit committed, then the process died before capturing the hold
+        self.assertTrue(self.transfer.credit())
+        Account.objects.filter(pk=self.receiver.pk).update(
+            status=Account.Status.INACTIVE
+        )
+
+        transfer = CrossShardTransfer.objects.get(pk=self.transfer.pk)
+        self.assertTrue(transfer.settle())
+
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, CrossShardTransfer.Status.COMPLETED)
+        self.assertEqual(self.balances(self.account), (Decimal("60"), Decimal("0")))
+        self.assertEqual(self.balances(self.receiver), (Decimal("40"), Decimal("0")))
+        self.assertEqual(self.receiver.transactions.count(), 1)
+
+
+class BranchIdTests(TestCase):
+    databases = "__all__"
+
+    def test_branch_id_has_5_characters(self):
+        for branch_id in ("0001", "1"):
+            with self.assertRaises(ValidationError):
+                Branch(branch_id=branch_id, branch_name="Short").full_clean()
+
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Branch.objects.create(branch_id=branch_id, branch_name="Short")
+
+        Branch(branch_id="00002", branch_name="Branch").full_clean()
+
+
+class BranchSequenceTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.branch = Branch.objects.create(branch_id="00001", branch_name="Test")
+        models._account_number_blocks.clear()
+
+    def test_reserve_runs_without_the_process_lock(self):
+        reserve = BranchSequence.reserve
+
+        def check_reserve(branch, size):
+            # other branches, and blocks in memory, are not held up meanwhile
+            self.assertFalse(models._account_number_lock.locked())
+            return reserve(branch, size)
+
+        values = []
+        with override_settings(ACCOUNT_NUMBER_BLOCK_SIZE=2), mock.patch.object(
+            BranchSequence, "reserve", side_effect=check_reserve
+        ) as reserve_mock:
+            for _ in range(3):
+                with self.captureOnCommitCallbacks(execute=True):
+                    values.append(BranchSequence.next_value(self.branch))
+
+        self.assertEqual(values, [1, 2, 3])
+        self.assertEqual(reserve_mock.call_count, 2)
+
+
+# set DB_SHARDS and BRANCH_SHARDS to run these, i.e.
+# DB_SHARDS=shard1=bank_shard1@db BRANCH_SHARDS=00002=shard1
+SHARD = (shard_aliases()[1:] or [None])[0]
+SHARD_BRANCH_ID = next(
+    (branch for branch, alias in settings.BRANCH_SHARDS.items() if alias == SHARD),
+    None,
+)
+
+
+@skipUnless(SHARD, "needs a shard in DB_SHARDS and BRANCH_SHARDS")
+class ShardTests(TestCase):
+    databases = "__all__"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(
+            branch_id=SHARD_BRANCH_ID, branch_name="Shard"
+        )
+        cls.staff = create_user(
+            username="test-staff", password=PASSWORD, role=Profile.Role.STAFF
+        )
+
+    def test_users_and_branches_are_copied_on_save(self):
+        customer = create_user(
+            username="test-customer", password=PASSWORD, role=Profile.Role.CUSTOMER
+        )
+        self.assertTrue(User.objects.using(SHARD).filter(pk=customer.pk).exists())
+        self.assertTrue(Profile.objects.using(SHARD).filter(user=customer).exists())
+        self.assertTrue(Branch.objects.using(SHARD).filter(pk=self.branch.pk).exists())
+
+        customer.first_name = "Renamed"
+        customer.save()
+        self.assertEqual(
+            User.objects.using(SHARD).get(pk=customer.pk).first_name, "Renamed"
+        )
+
+        # accounts of a user created after the shard was set up
+        account = Account.create_account(
+            maker=self.staff,
+            owner=customer,
+            balance=Decimal("10.00"),
+            branch=self.branch,
+            account_type=Account.Type.SAVING,
+        )
+        self.assertEqual(shard_for_account_number(account.account_number), SHARD)
+        self.assertEqual(account._state.db, SHARD)
+        # run the deferred foreign key checks of the shard now
+        with transaction.get_connection(SHARD).cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        customer.delete()
+        self.assertFalse(User.objects.using(SHARD).filter(pk=customer.pk).exists())
+
+    def test_account_summary_reads_every_shard(self):
+        customer = create_user(
+            username="test-customer", password=PASSWORD, role=Profile.Role.CUSTOMER
+        )
+        default_branch = Branch.objects.create(branch_id="00001", branch_name="Test")
+        for branch in (default_branch, self.branch):
+            Account.create_account(
+                maker=self.staff,
+                owner=customer,
+                balance=Decimal("10.00"),
+                branch=branch,
+                account_type=Account.Type.SAVING,
+            )
+
+        for lean in (True, False):
+            cache.clear()
+            with self.subTest(lean=lean), override_settings(ACCOUNT_LEAN_READS=lean):
+                data = get_account_summary(customer, request=None)
+                self.assertEqual(
+                    sorted(account["branch"] for account in data["accounts"]),
+                    sorted([default_branch.pk, self.branch.pk]),
+                )
+
+    def test_copy_shared_rows(self):
+        User.objects.using(SHARD).filter(pk=self.staff.pk).delete()
+
+        call_command("copy-shared-rows", stdout=io.StringIO())
+
+        self.assertTrue(User.objects.using(SHARD).filter(pk=self.staff.pk).exists())
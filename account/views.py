@@ -1,5 +1,6 @@
 import datetime
-from django.http import QueryDict
+from django.conf import settings
+from django.http import QueryDict, StreamingHttpResponse
 from rest_framework import mixins, viewsets
 from django.shortcuts import render
 from rest_framework.permissions import (
@@ -8,24 +9,44 @@ from rest_framework.permissions import (
     DjangoObjectPermissions,
 )
 from rest_framework.response import Response
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.decorators import action
-from account.models import Account
+from account.audit import account_log_batch
+from account.cache import get_account_summary, get_summary_state
+from account.exports import EXPORT_FORMATS, STATEMENT_EXPORT_FIELDS
+from account.models import Account, CrossShardTransfer, Hold
+from account.pagination import StatementCursorPagination
+from account.readers import statement_data, statement_values
 from account.serializers import (
+    AccountNumbersSerializer,
     AccountTransactionSerializer,
+    BulkPostingSerializer,
     CustomerAccountDetailSerializer,
     CustomerCreateAccountSerializer,
+    HoldIdsSerializer,
+    HoldSerializer,
     TransactionMakerSerializer,
 )
 from django.contrib.auth.models import User
 
 from common.auth.permissions import AdminOrStaffPermission, CustomerAccessPermission
 
-from django.db import transaction
+from django.db import OperationalError, transaction
+from django.db.models import Max
+from django.utils import timezone
 
 from common.auth.serializers import CustomerInquirySerializer
-from utils.date_utils import now, parse_datetime
-from dateutil.relativedelta import relativedelta
+from common.mixins import ReplicaReadMixin
+from core.db_routers import (
+    group_by_shard,
+    shard_aliases,
+    shard_for_account_number,
+    shard_for_branch,
+    use_shard,
+)
+from utils.date_utils import now, parse_datetime, resolve_date_range
+from utils.db_utils import lock_policy, lock_rows, retry_on_conflict
+from utils.http_utils import make_etag, not_modified, set_validators
 
 
 # Create your views here.
@@ -81,7 +102,9 @@ class CustomerAccountManageViewSet(viewsets.ModelViewSet):
     def activate(self, request, pk):
 
         # select for update instance
-        with transaction.atomic():
+        with use_shard(shard_for_account_number(pk)) as db, transaction.atomic(
+            using=db
+        ):
             account = (
                 Account.objects.select_for_update().filter(account_number=pk).last()
             )
@@ -93,11 +116,35 @@ class CustomerAccountManageViewSet(viewsets.ModelViewSet):
 
             return Response(f"Activated account {account}")
 
+    @action(
+        methods=["POST"],
+        detail=False,
+        serializer_class=AccountNumbersSerializer,
+    )
+    def activate_accounts(self, request):
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # one UPDATE for the accounts, one bulk insert for their logs, per shard
+        accounts = []
+        for db, account_numbers in group_by_shard(
+            serializer.validated_data.get("account_numbers")
+        ).items():
+            with use_shard(db), account_log_batch():
+                accounts += Account.activate_many(account_numbers, maker=request.user)
+
+        return Response(
+            data={"activated": [account.account_number for account in accounts]}
+        )
+
     @action(methods=["PUT"], detail=True)
     def deactivate(self, request, pk):
 
         # select for update instance
-        with transaction.atomic():
+        with use_shard(shard_for_account_number(pk)) as db, transaction.atomic(
+            using=db
+        ):
             account = (
                 Account.objects.select_for_update().filter(account_number=pk).last()
             )
@@ -115,6 +162,7 @@ class CustomerAccountManageViewSet(viewsets.ModelViewSet):
         serializer_class=TransactionMakerSerializer,
         permission_classes=[AdminOrStaffPermission],
     )
+    @retry_on_conflict
     def deposit(self, request, pk):
 
         serializer = self.get_serializer(data=request.data)
@@ -123,21 +171,24 @@ class CustomerAccountManageViewSet(viewsets.ModelViewSet):
         validated_data = serializer.validated_data
         amount = validated_data.get("amount")
 
-        # select for update instance
-        with transaction.atomic():
-            account = (
-                Account.objects.select_for_update().filter(account_number=pk).last()
-            )
+        # balance is updated by one conditional UPDATE, no up-front row lock
+        with use_shard(shard_for_account_number(pk)), lock_policy():
+            account = Account.objects.filter(account_number=pk).last()
             if not account:
                 raise NotFound("Invalid account")
             if account.status != Account.Status.ACTIVE:
                 raise NotFound("Account is locked, Please contact admin for unlock.")
 
-            # update
-            account.deposit(amount=float(amount), maker=self.request.user)
+            try:
+                # update
+                account.deposit(amount=amount, maker=self.request.user)
+            except OperationalError:
+                raise
+            except Exception as error:
+                raise NotFound(str(error))
 
             return Response(
-                f"Deposit {amount} to account {account}. Balance = {account.balance}"
+                f"Deposit {amount} to account {account}. Balance = {account.total_balance}"
             )
 
     @action(
@@ -146,6 +197,7 @@ class CustomerAccountManageViewSet(viewsets.ModelViewSet):
         serializer_class=TransactionMakerSerializer,
         permission_classes=[AdminOrStaffPermission],
     )
+    @retry_on_conflict
     def withdraw(self, request, pk):
 
         serializer = self.get_serializer(data=request.data)
@@ -154,11 +206,9 @@ class CustomerAccountManageViewSet(viewsets.ModelViewSet):
         validated_data = serializer.validated_data
         amount = validated_data.get("amount")
 
-        # select for update instance
-        with transaction.atomic():
-            account = (
-                Account.objects.select_for_update().filter(account_number=pk).last()
-            )
+        # balance is updated by one conditional UPDATE, no up-front row lock
+        with use_shard(shard_for_account_number(pk)), lock_policy():
+            account = Account.objects.filter(account_number=pk).last()
             if not account:
                 raise NotFound("Invalid account")
             if account.status != Account.Status.ACTIVE:
@@ -166,12 +216,14 @@ class CustomerAccountManageViewSet(viewsets.ModelViewSet):
 
             try:
                 # update
-                account.withdraw(amount=float(amount), maker=self.request.user)
+                account.withdraw(amount=amount, maker=self.request.user)
+            except OperationalError:
+                raise
             except Exception as error:
                 raise NotFound(str(error))
 
             return Response(
-                f"Withdraw {amount} to account {account}. Balance = {account.balance}"
+                f"Withdraw {amount} to account {account}. Balance = {account.total_balance}"
             )
 
     @action(
@@ -180,6 +232,7 @@ class CustomerAccountManageViewSet(viewsets.ModelViewSet):
         serializer_class=TransactionMakerSerializer,
         permission_classes=[AdminOrStaffPermission],
     )
+    @retry_on_conflict
     def transfer(self, request, pk):
 
         serializer = self.get_serializer(data=request.data)
@@ -189,28 +242,37 @@ class CustomerAccountManageViewSet(viewsets.ModelViewSet):
         amount = validated_data.get("amount")
         receiver_account_number = validated_data.get("receiver_account_number")
 
-        # select for update instance
-        with transaction.atomic():
-
-            receiver_account = (
-                Account.objects.select_for_update()
-                .filter(
-                    account_number=receiver_account_number,
-                    status=Account.Status.ACTIVE,
+        db = shard_for_account_number(pk)
+        if (
+            receiver_account_number
+            and shard_for_account_number(receiver_account_number) != db
+        ):
+            return self.cross_shard_transfer(pk, receiver_account_number, amount)
+
+        # lock both accounts in one statement, always in primary key order,
+        # so opposite transfers between the same accounts cannot deadlock
+        with use_shard(db), lock_policy():
+            account_numbers = [pk, receiver_account_number]
+            accounts = {
+                account.account_number: account
+                for account in lock_rows(Account.objects)
+                .filter(account_number__in=account_numbers, balance_shards=1)
+                .order_by("id")
+            }
+            if len(accounts) < len(set(account_numbers)):
+                # sharded hot accounts are posted shard by shard, never row-locked
+                accounts.update(
+                    (account.account_number, account)
+                    for account in Account.objects.filter(
+                        account_number__in=account_numbers, balance_shards__gt=1
+                    )
                 )
-                .last()
-            )
-            if not receiver_account:
+
+            receiver_account = accounts.get(receiver_account_number)
+            if not receiver_account or not receiver_account.is_active:
                 raise NotFound("Invalid receiver account")
 
-            account = (
-                Account.objects.select_for_update()
-                .filter(
-                    account_number=pk,
-                    status=Account.Status.ACTIVE,
-                )
-                .last()
-            )
+            account = accounts.get(pk)
             if not account:
                 raise NotFound("Invalid account")
             if account.status != Account.Status.ACTIVE:
@@ -222,22 +284,206 @@ class CustomerAccountManageViewSet(viewsets.ModelViewSet):
             try:
                 # update
                 account.transfer(
-                    amount=float(amount),
+                    amount=amount,
                     receiver_account=receiver_account,
                     maker=self.request.user,
                 )
+            except OperationalError:
+                raise
             except Exception as error:
                 raise NotFound(str(error))
 
             return Response(f"Transfer {amount} to account {receiver_account}.")
 
+    def cross_shard_transfer(self, pk, receiver_account_number, amount):
+        receiver_account = Account.objects.filter(
+            account_number=receiver_account_number
+        ).last()
+        if not receiver_account or not receiver_account.is_active:
+            raise NotFound("Invalid receiver account")
+
+        # step 1 commits on the sender's shard before the receiver is credited
+        with use_shard(shard_for_account_number(pk)), lock_policy():
+            account = Account.objects.filter(account_number=pk).last()
+            if not account:
+                raise NotFound("Invalid account")
+            if account.status != Account.Status.ACTIVE:
+                raise NotFound("Account is locked, Please contact admin for unlock.")
+
+            try:
+                transfer = CrossShardTransfer.prepare(
+                    account=account,
+                    receiver_account_number=receiver_account_number,
+                    amount=amount,
+                    maker=self.request.user,
+                )
+            except OperationalError:
+                raise
+            except Exception as error:
+                raise NotFound(str(error))
+
+        try:
+            completed = transfer.settle()
+        except OperationalError:
+            # never retried from here, settle-cross-shard-transfers finishes it
+            return Response(
+                f"Transfer {amount} to account {receiver_account} is pending.",
+                status=202,
+            )
+
+        if not completed:
+            raise NotFound("Invalid receiver account")
+
+        return Response(f"Transfer {amount} to account {receiver_account}.")
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        serializer_class=BulkPostingSerializer,
+        permission_classes=[AdminOrStaffPermission],
+    )
+    @retry_on_conflict
+    def postings(self, request):
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        postings = serializer.validated_data.get("postings")
+
+        account_numbers = [posting["account_number"] for posting in postings] + [
+            posting["receiver_account_number"]
+            for posting in postings
+            if posting.get("receiver_account_number")
+        ]
+        shards = group_by_shard(account_numbers)
+        if len(shards) > 1:
+            raise NotFound("Cannot post across shards")
+
+        # whole batch is applied or rejected together
+        with use_shard(next(iter(shards))), lock_policy():
+            try:
+                balances = Account.post_batch(postings, maker=self.request.user)
+            except OperationalError:
+                raise
+            except Exception as error:
+                raise NotFound(str(error))
+
+            return Response(
+                data={"postings": len(postings), "balances": balances},
+                status=201,
+            )
+
+    @action(
+        methods=["PUT"],
+        detail=True,
+        serializer_class=TransactionMakerSerializer,
+        permission_classes=[AdminOrStaffPermission],
+    )
+    @retry_on_conflict
+    def hold(self, request, pk):
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        validated_data = serializer.validated_data
+        amount = validated_data.get("amount")
+        receiver_account_number = validated_data.get("receiver_account_number")
+
+        if receiver_account_number and shard_for_account_number(
+            receiver_account_number
+        ) != shard_for_account_number(pk):
+            raise NotFound("Cannot hold across shards")
+
+        # only the held amount is reserved now, balances move on capture
+        with use_shard(shard_for_account_number(pk)), lock_policy():
+            account = Account.objects.filter(account_number=pk).last()
+            if not account:
+                raise NotFound("Invalid account")
+            if account.status != Account.Status.ACTIVE:
+                raise NotFound("Account is locked, Please contact admin for unlock.")
+
+            receiver_account = None
+            if receiver_account_number:
+                receiver_account = Account.objects.filter(
+                    account_number=receiver_account_number
+                ).last()
+                if not receiver_account or not receiver_account.is_active:
+                    raise NotFound("Invalid receiver account")
+                if receiver_account.account_number == account.account_number:
+                    raise NotFound("Cannot Process")
+
+            try:
+                hold = Hold.authorize(
+                    account=account,
+                    amount=amount,
+                    maker=self.request.user,
+                    receiver_account=receiver_account,
+                )
+            except OperationalError:
+                raise
+            except Exception as error:
+                raise NotFound(str(error))
+
+            return Response(data=HoldSerializer(hold).data, status=201)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        serializer_class=HoldIdsSerializer,
+        permission_classes=[AdminOrStaffPermission],
+    )
+    @retry_on_conflict
+    def capture_holds(self, request):
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        hold_ids = serializer.validated_data.get("hold_ids")
+
+        captured = released = 0
+        for db in self.get_hold_shards(serializer.validated_data):
+            with use_shard(db), lock_policy():
+                batch_captured, batch_released = Hold.capture_batch(hold_ids=hold_ids)
+            captured += batch_captured
+            released += batch_released
 
-class CustomerInquiryViewSet(viewsets.ModelViewSet):
-    queryset = (
-        Account.objects.select_related("owner", "branch")
-        .prefetch_related("transactions")
-        .all()
+        return Response(data={"captured": captured, "released": released})
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        serializer_class=HoldIdsSerializer,
+        permission_classes=[AdminOrStaffPermission],
     )
+    @retry_on_conflict
+    def release_holds(self, request):
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        hold_ids = serializer.validated_data.get("hold_ids")
+        if not hold_ids:
+            raise NotFound("require hold_ids")
+
+        released = 0
+        for db in self.get_hold_shards(serializer.validated_data):
+            with use_shard(db):
+                released += Hold.release_batch(hold_ids=hold_ids)
+
+        return Response(data={"released": released})
+
+    def get_hold_shards(self, validated_data):
+        # hold ids are only unique within one shard
+        branch_id = validated_data.get("branch_id")
+        if branch_id:
+            return [shard_for_branch(branch_id)]
+        if validated_data.get("hold_ids") and len(shard_aliases()) > 1:
+            raise NotFound("require branch_id")
+        return shard_aliases()
+
+
+class CustomerInquiryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    queryset = Account.objects.select_related("owner", "branch").all()
     permission_classes = [IsAuthenticated, CustomerAccessPermission]
     serializer_class = CustomerInquirySerializer
     lookup_field = "account_number"
@@ -248,41 +494,131 @@ class CustomerInquiryViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
 
-        data = CustomerInquirySerializer(
-            request.user, context={"request": request}
-        ).data
-        return Response(data)
-
-    @action(methods=["GET"], detail=True, serializer_class=AccountTransactionSerializer)
-    def statement(self, request, account_number):
-        params: QueryDict = request.query_params
+        # read from the accounts, a cache missing a version bump cannot hide a
+        # change behind a 304
+        state = get_summary_state(request.user.pk)
+        etag = make_etag("summary", request.user.pk, state)
+        response = not_modified(request, etag=etag)
+        if response is not None:
+            return response
+
+        data = get_account_summary(request.user, request, state)
+        return set_validators(Response(data), etag=etag)
+
+    def get_owned_account(self, account_number):
+        account = (
+            self.filter_queryset(self.get_queryset())
+            .filter(account_number=account_number)
+            .last()
+        )
+        if not account:
+            raise NotFound("Invalid account")
+        return account
 
-        start_date = parse_datetime(params.get("start_date"))
-        end_date = parse_datetime(params.get("end_date"))
-        filter_condition = {}
+    def get_statement_range(self, max_days: int = None):
+        params: QueryDict = self.request.query_params
 
-        if start_date is None:
-            start_date = (now() - relativedelta(months=6)).replace(
-                hour=0, minute=0, second=0, microsecond=0
+        try:
+            return resolve_date_range(
+                params.get("start_date"), params.get("end_date"), max_days=max_days
             )
-        if end_date is None:
-            end_date = now().replace(hour=0, minute=0, second=0, microsecond=0)
-
-        elif isinstance(start_date, datetime.datetime):
-            filter_condition["create_at__gte"] = start_date
+        except ValueError as error:
+            raise ValidationError(str(error))
 
-        elif isinstance(end_date, datetime.datetime):
-            filter_condition["create_at__lte"] = end_date
+    def get_statement_transactions(self, account, start_date, end_date):
+        return account.transactions.filter(
+            create_at__gte=start_date, create_at__lt=end_date
+        )
 
-        if start_date > end_date:
-            raise NotFound("Invalid start date and end date")
+    @action(
+        methods=["GET"],
+        detail=True,
+        serializer_class=AccountTransactionSerializer,
+        pagination_class=StatementCursorPagination,
+    )
+    def statement(self, request, account_number):
+        account = self.get_owned_account(account_number)
+        start_date, end_date = self.get_statement_range(
+            settings.STATEMENT_MAX_RANGE_DAYS
+        )
+        transactions = self.get_statement_transactions(account, start_date, end_date)
+
+        # transactions are append-only, the newest row in range validates the page
+        last = transactions.aggregate(id=Max("id"), create_at=Max("create_at"))
+        etag = make_etag(
+            "statement",
+            account.pk,
+            last["id"],
+            request.query_params.urlencode(),
+        )
+        response = not_modified(request, etag=etag, last_modified=last["create_at"])
+        if response is not None:
+            return response
+
+        if settings.ACCOUNT_LEAN_READS:
+            page = self.paginate_queryset(statement_values(transactions))
+            data = statement_data(page)
+        else:
+            page = self.paginate_queryset(transactions)
+            data = self.get_serializer(page, many=True).data
+
+        response = self.get_paginated_response(data)
+        # the balances hold for the whole range, they are sent with its first
+        # page only instead of being summed up again for every page
+        if self.paginator.cursor_query_param not in request.query_params:
+            response.data["opening_balance"] = account.balance_as_of(start_date)
+            response.data["closing_balance"] = account.balance_as_of(end_date)
+        return set_validators(response, etag=etag, last_modified=last["create_at"])
+
+    @action(methods=["GET"], detail=True)
+    def balance(self, request, account_number):
+        account = self.get_owned_account(account_number)
+
+        date = request.query_params.get("date")
+        if date:
+            moment = parse_datetime(date)
+            if moment is None:
+                raise NotFound("Invalid date")
+            # balance at the end of the requested day
+            moment += datetime.timedelta(days=1)
+        else:
+            moment = now()
+
+        balance = account.balance_as_of(moment)
+        if balance is None:
+            raise NotFound("Account was not opened on this date")
+
+        return Response(
+            data={
+                "account_number": account.account_number,
+                "date": date or timezone.localdate(moment).isoformat(),
+                "balance": balance,
+            }
+        )
 
-        account = self.get_queryset().filter(account_number=account_number).last()
-        if not account:
-            raise NotFound("Invalid account")
-        transactions = account.transactions.filter(**filter_condition)
-        serializer = self.get_serializer(
-            transactions, context={"request": request}, many=True
+    @action(methods=["GET"], detail=True)
+    def export(self, request, account_number):
+        file_format = request.query_params.get("file_format", "ndjson")
+        if file_format not in EXPORT_FORMATS:
+            raise NotFound("Invalid file format")
+        stream, content_type = EXPORT_FORMATS[file_format]
+
+        account = self.get_owned_account(account_number)
+        # auditors export several years at once, the range is not capped
+        start_date, end_date = self.get_statement_range()
+        transactions = self.get_statement_transactions(account, start_date, end_date)
+
+        # server-side cursor, rows are fetched chunk by chunk while streaming
+        rows = (
+            transactions.order_by("create_at", "id")
+            .values_list(*STATEMENT_EXPORT_FIELDS)
+            .iterator(chunk_size=settings.STATEMENT_EXPORT_CHUNK_SIZE)
         )
 
-        return Response(data=serializer.data)
+        response = StreamingHttpResponse(
+            self.replica_stream(stream(rows)), content_type=content_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="statement-{account_number}.{file_format}"'
+        )
+        return response
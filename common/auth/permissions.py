@@ -3,6 +3,14 @@ from rest_framework.permissions import BasePermission
 from common.models import Profile
 
 
+class AdminPermission(BasePermission):
+
+    def has_permission(self, request, view):
+        if request.user.is_authenticated:
+            return Profile.has_admin_role(request.user)
+        return False
+
+
 class AdminOrStaffPermission(BasePermission):
 
     def has_permission(self, request, view):
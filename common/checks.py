@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Error, Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+def is_process_local_cache() -> bool:
+    """True when every worker process has its own copy of the default cache."""
+    backend = type(caches["default"])
+    return f"{backend.__module__}.{backend.__qualname__}" in PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches)
+def check_profile_role_cache(app_configs, **kwargs):
+    # a role change would only reach the worker that saved it
+    if settings.PROFILE_ROLE_CACHE_TIMEOUT and is_process_local_cache():
+        return [
+            Error(
+                "PROFILE_ROLE_CACHE_TIMEOUT needs a cache shared by every worker.",
+                hint="Set CACHE_URL to a shared cache (i.e. redis://redis:6379/1)"
+                " or PROFILE_ROLE_CACHE_TIMEOUT to 0.",
+                id="common.E001",
+            )
+        ]
+    return []
+
+
+@register(Tags.caches)
+def check_account_summary_cache(app_configs, **kwargs):
+    # summary versions are bumped in the cache of the worker that saw the
+    # change, the others rebuild the summary until their version expires
+    if not settings.DEBUG and is_process_local_cache():
+        return [
+            Warning(
+                "Account summaries are versioned in a cache that is not shared"
+                " between workers.",
+                hint="Set CACHE_URL to a shared cache (i.e. redis://redis:6379/1)"
+                " unless a single worker process serves the API.",
+                id="common.W001",
+            )
+        ]
+    return []
@@ -0,0 +1,115 @@
+import contextvars
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# metrics of the request being handled, see measure()
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+_endpoint_stats = {}
+_endpoint_lock = threading.Lock()
+
+
+@dataclass
+class RequestMetrics:
+    queries: int = 0
+    db_time: float = 0.0
+    # statements locking rows, SELECT ... FOR UPDATE and UPDATE (postings
+    # move balances with a conditional UPDATE), waits included
+    lock_time: float = 0.0
+    serialize_time: float = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper() hook, on every database alias
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+            if sql.lstrip().startswith("UPDATE") or "FOR UPDATE" in sql:
+                self.lock_time += duration
+
+
+@contextmanager
+def measure(metrics: RequestMetrics = None):
+    """
+    Count the queries and DB time of the block, on every database. Pass the
+    ``metrics`` of an earlier block to keep adding to them.
+    """
+    if metrics is None:
+        metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for alias in settings.DATABASES:
+                stack.enter_context(connections[alias].execute_wrapper(metrics))
+            yield metrics
+    finally:
+        _current.reset(token)
+
+
+def record_serialization(seconds: float):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.serialize_time += seconds
+
+
+def record_request(endpoint: str, metrics: RequestMetrics):
+    budget = settings.QUERY_BUDGETS.get(endpoint)
+    over_budget = budget is not None and metrics.queries > budget
+    if over_budget:
+        logger.warning(
+            "%s ran %s queries, budget is %s", endpoint, metrics.queries, budget
+        )
+
+    with _endpoint_lock:
+        stats = _endpoint_stats.setdefault(
+            endpoint,
+            {
+                "requests": 0,
+                "queries": 0,
+                "max_queries": 0,
+                "over_budget": 0,
+                "db_seconds": 0.0,
+                "lock_seconds": 0.0,
+                "serialize_seconds": 0.0,
+            },
+        )
+        stats["requests"] += 1
+        stats["queries"] += metrics.queries
+        stats["max_queries"] = max(stats["max_queries"], metrics.queries)
+        stats["over_budget"] += over_budget
+        stats["db_seconds"] += metrics.db_time
+        stats["lock_seconds"] += metrics.lock_time
+        stats["serialize_seconds"] += metrics.serialize_time
+
+
+def get_endpoint_stats() -> dict:
+    with _endpoint_lock:
+        return {
+            endpoint: {
+                **stats,
+                "budget": settings.QUERY_BUDGETS.get(endpoint),
+                "db_seconds": round(stats["db_seconds"], 6),
+                "lock_seconds": round(stats["lock_seconds"], 6),
+                "serialize_seconds": round(stats["serialize_seconds"], 6),
+            }
+            for endpoint, stats in _endpoint_stats.items()
+        }
+
+
+def endpoint_name(request) -> str | None:
+    """``"PUT customer-deposit"`` for a DRF action, None when unresolved."""
+    match = getattr(request, "resolver_match", None)
+    if match is None or not match.url_name:
+        return None
+    return f"{request.method} {match.url_name}"
@@ -0,0 +1,81 @@
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from common.metrics import endpoint_name, measure, record_request
+from core.db_routers import pin_to_primary
+
+
+class PrimaryPinMiddleware:
+    """
+    Pin a user to the primary database for ``DB_REPLICA_PIN_SECONDS`` after
+    a successful write request, so their next reads see their own writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        user = getattr(request, "user", None)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            pin_to_primary([user.pk])
+
+        return response
+
+
+class QueryMetricsMiddleware:
+    """
+    Count the queries, DB time, row lock time and serialization time of
+    every request and add them up per endpoint (``api/common/metrics/``).
+    With ``DEBUG`` they are also sent back as ``X-DB-*`` headers.
+
+    A streaming response runs most of its queries after the view returned,
+    while its chunks are sent. They are measured chunk by chunk and recorded
+    once the stream is done, and no ``X-DB-*`` headers are sent since the
+    headers leave before the stream.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with measure() as metrics:
+            response = self.get_response(request)
+
+        endpoint = endpoint_name(request)
+        if response.streaming:
+            response.streaming_content = self.measure_stream(
+                response.streaming_content, endpoint, metrics
+            )
+            return response
+
+        if endpoint:
+            record_request(endpoint, metrics)
+
+        if settings.DEBUG:
+            response["X-DB-Queries"] = metrics.queries
+            response["X-DB-Time-Ms"] = f"{metrics.db_time * 1000:.2f}"
+            response["X-DB-Lock-Time-Ms"] = f"{metrics.lock_time * 1000:.2f}"
+            response["X-Serialize-Time-Ms"] = f"{metrics.serialize_time * 1000:.2f}"
+
+        return response
+
+    def measure_stream(self, chunks, endpoint, metrics):
+        chunks = iter(chunks)
+        try:
+            while True:
+                with measure(metrics):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            # also when the client goes away before the end
+            if endpoint:
+                record_request(endpoint, metrics)
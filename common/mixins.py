@@ -0,0 +1,52 @@
+from contextlib import ExitStack
+
+from django.contrib import admin
+from rest_framework.permissions import SAFE_METHODS
+
+from core.db_routers import is_pinned_to_primary, use_replica
+
+
+class ReplicaReadMixin:
+    """
+    Serve safe requests of a viewset from the replica, unless the user is
+    pinned to the primary after a recent write.
+    """
+
+    reads_from_replica = False
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self.replica_reads:
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        # decided after authentication, the pin is per user
+        if request.method in SAFE_METHODS and not is_pinned_to_primary(request.user):
+            self.reads_from_replica = True
+            self.replica_reads.enter_context(use_replica())
+
+    def replica_stream(self, chunks):
+        """
+        Iterate ``chunks`` of a streaming response with the request's reads.
+
+        The response is streamed after ``dispatch`` has returned and left the
+        replica, so the queries run while streaming choose it again.
+        """
+        with use_replica(self.reads_from_replica):
+            yield from chunks
+
+
+class ReplicaReadModelAdmin(admin.ModelAdmin):
+    """``ModelAdmin`` whose change list is read from the replica."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method not in SAFE_METHODS or is_pinned_to_primary(request.user):
+            return super().changelist_view(request, extra_context)
+
+        with use_replica():
+            response = super().changelist_view(request, extra_context)
+            # template responses run their queries when rendered
+            if hasattr(response, "render"):
+                response.render()
+            return response
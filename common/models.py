@@ -1,3 +1,7 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
@@ -13,17 +17,72 @@ class Profile(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     role = models.CharField(choices=Role, default=Role.CUSTOMER)
 
+    @staticmethod
+    def role_version_key(user_id: int) -> str:
+        return f"profile-role-version:{user_id}"
+
+    @staticmethod
+    def role_cache_key(user_id: int, version: int) -> str:
+        return f"profile-role:{user_id}:{version}"
+
+    @classmethod
+    def get_role_version(cls, user_id: int) -> int:
+        key = cls.role_version_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            # time based, so a version lost to eviction never comes back lower
+            cache.add(key, time.time_ns() // 1_000_000, None)
+            version = cache.get(key)
+        return version
+
+    @classmethod
+    def bump_role_version(cls, user_id: int):
+        key = cls.role_version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns() // 1_000_000, None)
+
+    @classmethod
+    def get_role(cls, user) -> str:
+        """
+        Role of ``user``, or an empty string when it has no profile.
+
+        Looked up once per request (memoized on the user object). With
+        ``PROFILE_ROLE_CACHE_TIMEOUT`` it is also shared between requests
+        through the cache, under a version that is bumped once a saved or
+        deleted ``Profile`` of the user commits. A lookup racing with that
+        change is stored under the old version and never read again.
+        """
+        if not user or user.pk is None:
+            return ""
+
+        role = getattr(user, "_profile_role", None)
+        if role is not None:
+            return role
+
+        timeout = settings.PROFILE_ROLE_CACHE_TIMEOUT
+        if timeout:
+            key = cls.role_cache_key(user.pk, cls.get_role_version(user.pk))
+            role = cache.get(key)
+
+        if role is None:
+            user_profile = cls.objects.filter(user=user).last()
+            role = user_profile.role if user_profile else ""
+            if timeout:
+                cache.add(key, role, timeout)
+
+        user._profile_role = role
+        return role
+
     @classmethod
     def has_admin_role(cls, user):
-        user_profile = cls.objects.filter(user=user).last()
-        return user_profile and user_profile.role == cls.Role.ADMIN
+        return cls.get_role(user) == cls.Role.ADMIN
 
     @classmethod
     def has_staff_role(cls, user):
-        user_profile = cls.objects.filter(user=user).last()
-        return user_profile and user_profile.role == cls.Role.STAFF
+        return cls.get_role(user) == cls.Role.STAFF
 
     @classmethod
     def has_customer_role(cls, user):
-        user_profile = cls.objects.filter(user=user).last()
-        return user_profile and user_profile.role == cls.Role.CUSTOMER
+        return cls.get_role(user) == cls.Role.CUSTOMER
@@ -0,0 +1,76 @@
+import time
+from decimal import Decimal
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from common.metrics import record_serialization
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# everything orjson and msgpack do not handle natively is encoded like the
+# stock JSONRenderer does it
+_fallback = JSONEncoder()
+
+
+def _json_default(obj):
+    if isinstance(obj, Decimal):
+        # written as the exact number text, never through float
+        return orjson.Fragment(str(obj))
+    return _fallback.default(obj)
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    return _fallback.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` on top of orjson.
+
+    Decimals are written as JSON numbers with all their digits. Datetimes go
+    through the stock encoder so the output matches ``JSONRenderer``.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        # list and dict field errors are keyed by the int index of the item
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.get_indent(accepted_media_type, renderer_context):
+            option |= orjson.OPT_INDENT_2
+
+        started = time.perf_counter()
+        rendered = orjson.dumps(data, default=_json_default, option=option)
+        record_serialization(time.perf_counter() - started)
+        return rendered
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack responses for clients sending ``Accept: application/msgpack``.
+
+    Needs the optional ``msgpack`` package. Decimals are sent as strings, as
+    MessagePack has no decimal type.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        started = time.perf_counter()
+        rendered = msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+        record_serialization(time.perf_counter() - started)
+        return rendered
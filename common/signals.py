@@ -0,0 +1,27 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from common.models import Profile
+from core.db_routers import REPLICATED_MODELS, copy_to_shards, delete_from_shards
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def clear_profile_role_cache(sender, instance: Profile, **kwargs):
+    # once committed, or a concurrent lookup could cache the old role again
+    user_id = instance.user_id
+    transaction.on_commit(lambda: Profile.bump_role_version(user_id))
+
+
+@receiver(post_save)
+def copy_shared_row_to_shards(sender, instance, using, **kwargs):
+    # users, profiles and branches are written on the default database only
+    if using == DEFAULT_DB_ALIAS and sender._meta.label_lower in REPLICATED_MODELS:
+        copy_to_shards(sender, [instance])
+
+
+@receiver(post_delete)
+def delete_shared_row_from_shards(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS and sender._meta.label_lower in REPLICATED_MODELS:
+        delete_from_shards(sender, [instance.pk])
@@ -0,0 +1,30 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from common.metrics import measure
+
+
+@contextmanager
+def assert_query_budget(endpoint: str, max_queries: int = None):
+    """
+    Fail when the block runs more queries than ``QUERY_BUDGETS[endpoint]``
+    (or ``max_queries``), on every database together::
+
+        with assert_query_budget("PUT customer-deposit"):
+            client.put(f"/api/account/customer/{account_number}/deposit/", ...)
+
+    Requests made with ``force_authenticate()`` skip the session and user
+    lookups that a logged in client pays for. A streaming response runs its
+    queries while it is read, so read it inside the block.
+    """
+    budget = (
+        max_queries if max_queries is not None else settings.QUERY_BUDGETS[endpoint]
+    )
+    with measure() as metrics:
+        yield metrics
+
+    if metrics.queries > budget:
+        raise AssertionError(
+            f"{endpoint} ran {metrics.queries} queries, budget is {budget}"
+        )
@@ -1,3 +1,110 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from common.checks import check_account_summary_cache, check_profile_role_cache
+from common.helpers import create_user
+from common.metrics import measure
+from common.models import Profile
+
+PASSWORD = "11test2@Pass04"
+
+
+@override_settings(PROFILE_ROLE_CACHE_TIMEOUT=300)
+class ProfileRoleCacheTests(TestCase):
+    # users are copied to the shards, when there are any
+    databases = "__all__"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(
+            username="test-staff", password=PASSWORD, role=Profile.Role.STAFF
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_role(self):
+        # a new user object per request, like the session middleware
+        return Profile.get_role(User.objects.get(pk=self.user.pk))
+
+    def test_role_is_shared_between_requests(self):
+        self.assertEqual(self.get_role(), Profile.Role.STAFF)
+
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(Profile.get_role(user), Profile.Role.STAFF)
+
+    def test_role_change_is_seen_once_committed(self):
+        self.assertEqual(self.get_role(), Profile.Role.STAFF)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Profile.objects.filter(user=self.user).update(role=Profile.Role.CUSTOMER)
+            Profile.objects.get(user=self.user).save()
+            # not committed yet, the cached role still stands
+            self.assertEqual(self.get_role(), Profile.Role.STAFF)
+
+        self.assertEqual(self.get_role(), Profile.Role.CUSTOMER)
+
+    def test_lookup_racing_a_change_is_not_reused(self):
+        version = Profile.get_role_version(self.user.pk)
+        Profile.bump_role_version(self.user.pk)
+
+        # a lookup that started before the change stores under the old version
+        cache.add(Profile.role_cache_key(self.user.pk, version), Profile.Role.ADMIN)
+
+        self.assertEqual(self.get_role(), Profile.Role.STAFF)
+
+    def test_process_local_cache_is_rejected(self):
+        errors = check_profile_role_cache(None)
+        self.assertEqual([error.id for error in errors], ["common.E001"])
+
+        with override_settings(PROFILE_ROLE_CACHE_TIMEOUT=0):
+            self.assertEqual(check_profile_role_cache(None), [])
+
+
+class AccountSummaryCacheCheckTests(TestCase):
+
+    def test_process_local_cache_is_reported_outside_debug(self):
+        with override_settings(DEBUG=False):
+            errors = check_account_summary_cache(None)
+        self.assertEqual([error.id for error in errors], ["common.W001"])
+
+        with override_settings(DEBUG=True):
+            self.assertEqual(check_account_summary_cache(None), [])
+
+        with override_settings(
+            DEBUG=False,
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+                }
+            },
+        ):
+            self.assertEqual(check_account_summary_cache(None), [])
+
+
+class RequestMetricsTests(TestCase):
+    databases = "__all__"
+
+    def test_lock_time_counts_row_locking_statements(self):
+        user = create_user(
+            username="metrics", password=PASSWORD, role=Profile.Role.CUSTOMER
+        )
+        with connection.cursor() as cursor:
+            with measure() as metrics:
+                cursor.execute("SELECT id FROM auth_user WHERE id = %s", [user.pk])
+            self.assertEqual(metrics.queries, 1)
+            self.assertEqual(metrics.lock_time, 0)
+
+            with measure() as metrics:
+                cursor.execute(
+                    "SELECT id FROM auth_user WHERE id = %s FOR UPDATE", [user.pk]
+                )
+                cursor.execute(
+                    "UPDATE auth_user SET last_login = NULL WHERE id = %s", [user.pk]
+                )
+            self.assertEqual(metrics.queries, 2)
+            self.assertGreater(metrics.lock_time, 0)
+            self.assertEqual(metrics.lock_time, metrics.db_time)
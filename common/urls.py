@@ -1,9 +1,10 @@
 from rest_framework import routers
 
-from common.views import LoginViewSet, CustomerRegistrationViewSet
+from common.views import LoginViewSet, CustomerRegistrationViewSet, MetricsViewSet
 
 router = routers.DefaultRouter()
 router.register("login", LoginViewSet, basename="login")
 router.register("registration", CustomerRegistrationViewSet, basename="registration")
+router.register("metrics", MetricsViewSet, basename="metrics")
 
 urlpatterns = router.urls
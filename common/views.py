@@ -1,6 +1,6 @@
 from django.contrib.auth.models import User
 from django.contrib.auth import login, logout
-from common.auth.permissions import AdminOrStaffPermission
+from common.auth.permissions import AdminOrStaffPermission, AdminPermission
 from rest_framework import viewsets, serializers, mixins
 from rest_framework.response import Response
 from rest_framework.permissions import (
@@ -8,8 +8,8 @@ from rest_framework.permissions import (
     AllowAny,
     DjangoObjectPermissions,
 )
+from account.cache import get_account_summary
 from common.auth.serializers import (
-    CustomerInquirySerializer,
     CustomerRegistrationSerializer,
     SessionLoginSerializer,
 )
@@ -18,7 +18,10 @@ from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_protect, ensure_csrf_cookie
 from django.middleware.csrf import get_token
 
+from common.metrics import get_endpoint_stats
 from common.models import Profile
+from core.db_backends.postgresql_pool.pool import get_pool_stats
+from utils.db_utils import get_conflict_stats
 
 
 # Create your views here.
@@ -41,7 +44,7 @@ class LoginViewSet(viewsets.GenericViewSet):
         if Profile.has_admin_role(user) or Profile.has_staff_role(user):
             data = f"Welcome {user}"
         else:
-            data = CustomerInquirySerializer(user, context={"request": request}).data
+            data = get_account_summary(user, request)
         response = Response(data=data)
         response.set_cookie("token", get_token(request))
         return response
@@ -53,3 +56,20 @@ class LoginViewSet(viewsets.GenericViewSet):
 class CustomerRegistrationViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated, AdminOrStaffPermission]
     serializer_class = CustomerRegistrationSerializer
+
+
+class MetricsViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated, AdminPermission]
+
+    def list(self, request):
+        # counters of this worker process only
+        return Response(
+            data={
+                "connection_pools": get_pool_stats(),
+                "db_conflicts": get_conflict_stats(),
+                "endpoints": get_endpoint_stats(),
+            }
+        )
+
+    def get_view_name(self):
+        return "Metrics"
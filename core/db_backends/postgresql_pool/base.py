@@ -0,0 +1,28 @@
+"""
+PostgreSQL backend taking its connections from an in-process pool.
+
+Django opens a connection on the first query of a request and closes it at
+the end (``CONN_MAX_AGE = 0``); here closing hands it back to the pool of
+its alias, so the next request skips the connection and TLS handshake.
+Configured with the ``POOL`` dict of the database settings, see
+``ConnectionPool`` for the keys.
+"""
+
+from django.db.backends.postgresql import base
+
+from core.db_backends.postgresql_pool.pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict.get("POOL", {}))
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        return self.pool.acquire(lambda: connect(conn_params))
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+_pools = {}
+_pools_lock = threading.Lock()
+# pools of the parent process, see _forget_pools()
+_inherited_pools = []
+
+
+class ConnectionPool:
+    """
+    Bounded set of open connections to one database, shared by the threads
+    of a process.
+
+    At most ``max_size`` connections are open. A thread that finds none idle
+    and the pool full waits up to ``timeout`` seconds for one to be released,
+    then gives up with ``OperationalError``. Idle connections are closed
+    after ``max_idle`` seconds and every connection after ``max_lifetime``.
+    With ``check`` an idle connection is pinged before it is handed out.
+    """
+
+    def __init__(
+        self,
+        alias: str,
+        max_size: int = 10,
+        timeout: float = 5.0,
+        max_lifetime: float = 3600.0,
+        max_idle: float = 600.0,
+        check: bool = False,
+    ):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check = check
+
+        self._cond = threading.Condition()
+        # (connection, released at), the most recently released last
+        self._idle = deque()
+        # connection -> opened at
+        self._opened_at = {}
+        self._opening = 0
+        self._checked_out = 0
+        self._waiters = 0
+
+        self._acquired = 0
+        self._created = 0
+        self._discarded = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    def acquire(self, connect):
+        """Idle connection, or a new one opened with ``connect()``."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            connection = self._checkout(deadline)
+            if connection is None:
+                connection = self._open(connect)
+            elif self.check and not self._is_alive(connection):
+                self._discard(connection)
+                continue
+            break
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._acquired += 1
+            self._wait_time += waited
+            self._max_wait_time = max(self._max_wait_time, waited)
+        return connection
+
+    def release(self, connection):
+        """Give ``connection`` back, closing it when it cannot be reused."""
+        if connection not in self._opened_at:
+            connection.close()
+            return
+
+        if not self._reset(connection) or self._too_old(connection):
+            self._discard(connection)
+            return
+
+        with self._cond:
+            self._checked_out -= 1
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": len(self._opened_at) + self._opening,
+                "idle": len(self._idle),
+                "checked_out": self._checked_out,
+                "waiters": self._waiters,
+                "acquired": self._acquired,
+                "created": self._created,
+                "discarded": self._discarded,
+                "timeouts": self._timeouts,
+                "wait_seconds_total": round(self._wait_time, 6),
+                "wait_seconds_max": round(self._max_wait_time, 6),
+            }
+
+    def _checkout(self, deadline):
+        # an idle connection, or None with a slot reserved for a new one
+        stale = []
+        try:
+            with self._cond:
+                while True:
+                    while self._idle:
+                        connection, released_at = self._idle.pop()
+                        if (
+                            connection.closed
+                            or self._too_old(connection)
+                            or time.monotonic() - released_at > self.max_idle
+                        ):
+                            self._forget(connection)
+                            stale.append(connection)
+                            continue
+                        self._checked_out += 1
+                        return connection
+
+                    if len(self._opened_at) + self._opening < self.max_size:
+                        self._opening += 1
+                        self._checked_out += 1
+                        return None
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise psycopg2.OperationalError(
+                            f"no connection to {self.alias} available within"
+                            f" {self.timeout}s, all {self.max_size} are checked out"
+                        )
+
+                    self._waiters += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+        finally:
+            for connection in stale:
+                self._close(connection)
+
+    def _open(self, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._checked_out -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._opening -= 1
+            self._opened_at[connection] = time.monotonic()
+            self._created += 1
+        return connection
+
+    def _discard(self, connection):
+        with self._cond:
+            self._forget(connection)
+            self._checked_out -= 1
+            self._cond.notify()
+        self._close(connection)
+
+    def _forget(self, connection):
+        self._opened_at.pop(connection, None)
+        self._discarded += 1
+
+    def _too_old(self, connection) -> bool:
+        opened_at = self._opened_at.get(connection, 0)
+        return time.monotonic() - opened_at > self.max_lifetime
+
+    def _reset(self, connection) -> bool:
+        # roll back whatever the last user left open
+        if connection.closed:
+            return False
+        status = connection.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            connection.rollback()
+        except psycopg2.Error:
+            return False
+        return connection.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+
+    def _is_alive(self, connection) -> bool:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+
+def get_pool(alias: str, options: dict) -> ConnectionPool:
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(alias, **options)
+        return _pools[alias]
+
+
+def get_pool_stats() -> dict:
+    """Stats of every pool opened by this process, by database alias."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+def _forget_pools():
+    # a forked child must open its own connections; the inherited ones stay
+    # referenced, closing them would end the parent's sessions too
+    global _pools_lock
+    _inherited_pools.extend(_pools.values())
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_pools)
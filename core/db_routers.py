@@ -0,0 +1,204 @@
+import contextvars
+from contextlib import contextmanager
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = "replica"
+
+# set while a request may read from the replica
+_use_replica = contextvars.ContextVar("use_replica", default=False)
+
+# database of the accounts the current block works on, see use_shard()
+_shard = contextvars.ContextVar("account_shard", default=None)
+
+# models stored next to their account, on the shard of its branch
+SHARDED_MODELS = {
+    "account.account",
+    "account.accountbalanceshard",
+    "account.accountlog",
+    "account.transaction",
+    "account.journalentry",
+    "account.hold",
+    "account.crossshardtransfer",
+    "account.dailybalance",
+}
+
+# kept on the default database and copied to every shard, where sharded rows
+# refer to them by foreign key; listed in foreign key order
+REPLICATED_MODELS = [
+    "auth.user",
+    "common.profile",
+    "account.branch",
+]
+
+
+def has_replica() -> bool:
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def use_replica(enabled: bool = True):
+    """Send the reads of the block to the replica, if one is configured."""
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def shard_aliases() -> list[str]:
+    """Every database holding accounts, the default one first."""
+    return [DEFAULT_DB_ALIAS] + sorted(
+        set(settings.BRANCH_SHARDS.values()) - {DEFAULT_DB_ALIAS}
+    )
+
+
+def shard_for_branch(branch_id: str) -> str:
+    return settings.BRANCH_SHARDS.get(branch_id, DEFAULT_DB_ALIAS)
+
+
+def shard_for_account_number(account_number: str) -> str:
+    # account numbers start with the branch id, exactly 5 characters long
+    return shard_for_branch(account_number[:5])
+
+
+def group_by_shard(account_numbers: Iterable[str]) -> dict[str, list[str]]:
+    shards = {}
+    for account_number in account_numbers:
+        shards.setdefault(shard_for_account_number(account_number), []).append(
+            account_number
+        )
+    return shards
+
+
+def copy_to_shards(model, instances: list):
+    """
+    Insert or update ``instances`` of a ``REPLICATED_MODELS`` model on every
+    shard, one statement per shard.
+
+    Runs right away, outside the transaction of the default database: a copy
+    of a row whose creation is rolled back stays behind, unused.
+    """
+    fields = model._meta.concrete_fields
+    for alias in shard_aliases()[1:]:
+        # copies, bulk_create moves the instances it saves to its database
+        model._base_manager.using(alias).bulk_create(
+            [
+                model(
+                    **{
+                        field.attname: getattr(instance, field.attname)
+                        for field in fields
+                    }
+                )
+                for instance in instances
+            ],
+            update_conflicts=True,
+            unique_fields=[model._meta.pk.name],
+            update_fields=[field.name for field in fields if not field.primary_key],
+        )
+
+
+def delete_from_shards(model, pks: list):
+    for alias in shard_aliases()[1:]:
+        model._base_manager.using(alias).filter(pk__in=pks).delete()
+
+
+@contextmanager
+def use_shard(alias: str):
+    """Store and read the account data of the block on ``alias``."""
+    token = _shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _shard.reset(token)
+
+
+def account_db() -> str:
+    """Database of the accounts the current block works on."""
+    return _shard.get() or DEFAULT_DB_ALIAS
+
+
+def primary_pin_key(user_id: int) -> str:
+    return f"db-primary-pin:{user_id}"
+
+
+def pin_to_primary(user_ids: Iterable[int]):
+    """Keep reads of ``user_ids`` on the primary while the replica catches up."""
+    if not has_replica():
+        return
+    cache.set_many(
+        {primary_pin_key(user_id): True for user_id in user_ids},
+        settings.DB_REPLICA_PIN_SECONDS,
+    )
+
+
+def is_pinned_to_primary(user) -> bool:
+    if not user or user.pk is None:
+        return False
+    return bool(cache.get(primary_pin_key(user.pk)))
+
+
+class BranchShardRouter:
+    """
+    Put accounts and everything recorded against them on the database of
+    their branch (``BRANCH_SHARDS``).
+
+    An instance stays on the database it was loaded from, new rows follow
+    their account, and anything else goes to the shard selected with
+    ``use_shard()``. Other models are left to the next router.
+    """
+
+    def _db_for(self, model, hints):
+        if model._meta.label_lower not in SHARDED_MODELS:
+            return None
+
+        instance = hints.get("instance")
+        db = instance._state.db if instance is not None else None
+        if db == REPLICA_DB_ALIAS or db is None:
+            db = _shard.get()
+
+        # the default shard may still be read from the replica
+        if db == DEFAULT_DB_ALIAS:
+            return None
+        return db
+
+    def db_for_read(self, model, **hints):
+        return self._db_for(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # shards carry the whole schema; users, profiles and branches are
+        # copies of the default database (REPLICATED_MODELS)
+        if db in settings.BRANCH_SHARDS.values():
+            return True
+        return None
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica inside ``use_replica()``, everything else to the
+    primary. Only the primary is migrated, the replica follows it through
+    database replication.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and has_replica():
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
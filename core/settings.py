@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import environ
 
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "common.middleware.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -59,6 +61,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "common.middleware.PrimaryPinMiddleware",
 ]
 
 ROOT_URLCONF = "core.urls"
@@ -83,6 +86,63 @@ WSGI_APPLICATION = "core.wsgi.application"
 
 DEFAULT_DATE_FORMAT = "%Y-%m-%d"
 
+# maximum number of postings accepted by one bulk posting request
+BULK_POSTING_MAX_SIZE = env("BULK_POSTING_MAX_SIZE", int, 1000)
+
+# account numbers reserved per round trip to the branch sequence row
+ACCOUNT_NUMBER_BLOCK_SIZE = env("ACCOUNT_NUMBER_BLOCK_SIZE", int, 20)
+
+# retries of a posting aborted by a deadlock or serialization failure
+DB_RETRY_ATTEMPTS = env("DB_RETRY_ATTEMPTS", int, 3)
+DB_RETRY_BASE_DELAY = env("DB_RETRY_BASE_DELAY", float, 0.05)
+
+# row locks of posting endpoints: "wait", "nowait" or "timeout"
+ACCOUNT_LOCK_MODE = env("ACCOUNT_LOCK_MODE", str, "wait")
+ACCOUNT_LOCK_TIMEOUT_MS = env("ACCOUNT_LOCK_TIMEOUT_MS", int, 500)
+# seconds sent as Retry-After when a lock is not available
+ACCOUNT_LOCK_RETRY_AFTER = env("ACCOUNT_LOCK_RETRY_AFTER", int, 1)
+
+# authorized holds captured per transaction, and hours before one is released
+HOLD_CAPTURE_BATCH_SIZE = env("HOLD_CAPTURE_BATCH_SIZE", int, 500)
+HOLD_EXPIRE_HOURS = env("HOLD_EXPIRE_HOURS", int, 168)
+
+# account logs buffered by a bulk job before one bulk insert
+ACCOUNT_LOG_BATCH_SIZE = env("ACCOUNT_LOG_BATCH_SIZE", int, 500)
+ACCOUNT_LOG_FLUSH_INTERVAL = env("ACCOUNT_LOG_FLUSH_INTERVAL", float, 1.0)
+
+# statement date range: default window and the longest window allowed
+STATEMENT_DEFAULT_RANGE_MONTHS = env("STATEMENT_DEFAULT_RANGE_MONTHS", int, 6)
+STATEMENT_MAX_RANGE_DAYS = env("STATEMENT_MAX_RANGE_DAYS", int, 366)
+
+# rows fetched per round trip while streaming a statement export
+STATEMENT_EXPORT_CHUNK_SIZE = env("STATEMENT_EXPORT_CHUNK_SIZE", int, 2000)
+
+# build statement and account summary responses from values_list() rows
+# instead of running every row through the model serializers
+ACCOUNT_LEAN_READS = env("ACCOUNT_LEAN_READS", bool, True)
+
+# most queries a request to an endpoint ("METHOD url-name") should run,
+# more is logged and counted by QueryMetricsMiddleware; the budgets include
+# the session, user and role lookups of a logged in client (no role cache),
+# and the queries an export runs while it streams (account.tests)
+QUERY_BUDGETS = {
+    "POST customer-create-account": 7,
+    "PUT customer-activate": 6,
+    "POST customer-activate-accounts": 6,
+    "PUT customer-deactivate": 6,
+    "PUT customer-deposit": 6,
+    "PUT customer-withdraw": 6,
+    "PUT customer-transfer": 7,
+    "POST customer-postings": 7,
+    "PUT customer-hold": 7,
+    "POST customer-capture-holds": 9,
+    "POST customer-release-holds": 6,
+    "GET financial-list": 5,
+    "GET financial-statement": 8,
+    "GET financial-balance": 6,
+    "GET financial-export": 5,
+}
+
 REST_FRAMEWORK = dict(
     PAGE_SIZE=20,
     DATE_INPUT_FORMATS=[DEFAULT_DATE_FORMAT],
@@ -97,6 +157,12 @@ REST_FRAMEWORK = dict(
     ],
     DEFAULT_PAGINATION_CLASS="rest_framework.pagination.PageNumberPagination",
     COERCE_DECIMAL_TO_STRING=False,
+    DEFAULT_RENDERER_CLASSES=[
+        "common.renderers.FastJSONRenderer",
+        # picked with "Accept: application/msgpack" when msgpack is installed
+        *(["common.renderers.MessagePackRenderer"] if find_spec("msgpack") else []),
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 )
 
 # Database
@@ -110,6 +176,9 @@ DATABASES = {
         "HOST": env("DB_HOST", str, "db"),
         "PORT": env("DB_PORT", int, 5432),
         "PASSWORD": env("DB_PASS", str, ""),
+        # keep connections open between requests, 0 closes them after each one
+        "CONN_MAX_AGE": env("DB_CONN_MAX_AGE", int, 0),
+        "CONN_HEALTH_CHECKS": env("DB_CONN_HEALTH_CHECKS", bool, False),
     }
     # "default": {
     #     "ENGINE": "django.db.backends.sqlite3",
@@ -117,6 +186,70 @@ DATABASES = {
     # }
 }
 
+# in-process connection pool, shared by the threads of a worker
+if env("DB_POOL", bool, False):
+    DATABASES["default"].update(
+        {
+            "ENGINE": "core.db_backends.postgresql_pool",
+            # connections go back to the pool at the end of every request
+            "CONN_MAX_AGE": 0,
+            "POOL": {
+                "max_size": env("DB_POOL_MAX_SIZE", int, 10),
+                "timeout": env("DB_POOL_TIMEOUT", float, 5.0),
+                "max_lifetime": env("DB_POOL_MAX_LIFETIME", float, 3600.0),
+                "max_idle": env("DB_POOL_MAX_IDLE", float, 600.0),
+                "check": DATABASES["default"]["CONN_HEALTH_CHECKS"],
+            },
+        }
+    )
+
+# optional streaming replica for inquiry, statement and admin list reads
+if env("DB_REPLICA_HOST", str, ""):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": env("DB_REPLICA_HOST", str),
+        "PORT": env("DB_REPLICA_PORT", int, DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+
+# account shards, alias=host or alias=name@host, e.g. "shard1=10.0.0.12"
+for alias, location in env.dict("DB_SHARDS", default={}).items():
+    name, _, host = location.rpartition("@")
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "NAME": name or DATABASES["default"]["NAME"],
+    }
+
+# the account summary reads the accounts and their state on every shard
+QUERY_BUDGETS["GET financial-list"] += 2 * len(env.dict("DB_SHARDS", default={}))
+
+# branch id -> shard alias, branches not listed stay on the default database
+BRANCH_SHARDS = env.dict("BRANCH_SHARDS", default={})
+
+DATABASE_ROUTERS = [
+    "core.db_routers.BranchShardRouter",
+    "core.db_routers.ReplicaRouter",
+]
+
+# seconds a user reads from the primary after a write touching them
+DB_REPLICA_PIN_SECONDS = env("DB_REPLICA_PIN_SECONDS", int, 5)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": env.cache_url("CACHE_URL", default="locmemcache://"),
+}
+
+# seconds a user's role is kept in the cache, 0 looks it up once per request;
+# only with a cache shared by every worker, roles guard every permission check
+PROFILE_ROLE_CACHE_TIMEOUT = env("PROFILE_ROLE_CACHE_TIMEOUT", int, 0)
+
+# seconds a customer's serialized account summary is kept in the cache
+ACCOUNT_SUMMARY_CACHE_TIMEOUT = env("ACCOUNT_SUMMARY_CACHE_TIMEOUT", int, 300)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
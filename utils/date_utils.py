@@ -1,15 +1,67 @@
 import datetime
 from dateutil.relativedelta import relativedelta
 
-from core.settings import DEFAULT_DATE_FORMAT
+from django.conf import settings
+from django.utils import timezone
 
 
 def now():
-    return datetime.datetime.now()
+    return timezone.now()
+
+
+def start_of_day(value: datetime.datetime):
+    return timezone.localtime(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def date_start(value: datetime.date):
+    """Aware datetime of midnight at the start of ``value``."""
+    return timezone.make_aware(datetime.datetime.combine(value, datetime.time()))
 
 
 def parse_datetime(value: str):
+    """Parse ``value`` in DEFAULT_DATE_FORMAT as an aware datetime, or None."""
     try:
-        return datetime.datetime.strptime(value, DEFAULT_DATE_FORMAT)
-    except:
+        parsed = datetime.datetime.strptime(value, settings.DEFAULT_DATE_FORMAT)
+    except (TypeError, ValueError):
         return None
+    return timezone.make_aware(parsed)
+
+
+def resolve_date_range(
+    start_date: str = None,
+    end_date: str = None,
+    max_days: int = None,
+    default_months: int = None,
+):
+    """
+    Turn optional ``start_date`` / ``end_date`` strings into a ``[start, end)`` range.
+
+    ``end_date`` is inclusive, so the returned end is midnight of the next day.
+    A missing end defaults to today and a missing start to ``default_months``
+    before the end. Raises ValueError for unparsable dates, a start after the
+    end, or a range longer than ``max_days`` when it is given.
+    """
+    if default_months is None:
+        default_months = settings.STATEMENT_DEFAULT_RANGE_MONTHS
+
+    start = parse_datetime(start_date)
+    if start_date and start is None:
+        raise ValueError("Invalid start date")
+
+    end = parse_datetime(end_date)
+    if end_date and end is None:
+        raise ValueError("Invalid end date")
+
+    if end is None:
+        end = start_of_day(now())
+    if start is None:
+        start = end - relativedelta(months=default_months)
+
+    if start > end:
+        raise ValueError("Invalid start date and end date")
+
+    end = end + datetime.timedelta(days=1)
+    if max_days is not None and end - start > datetime.timedelta(days=max_days):
+        raise ValueError(f"Date range must not exceed {max_days} days")
+
+    return start, end
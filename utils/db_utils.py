@@ -0,0 +1,140 @@
+import functools
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.db_routers import account_db
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL error codes worth retrying, the transaction was rolled back as a whole
+RETRYABLE_ERRORS = {
+    "40P01": "deadlock",
+    "40001": "serialization_failure",
+}
+
+# raised for NOWAIT and lock_timeout alike
+LOCK_NOT_AVAILABLE = "55P03"
+
+LOCK_MODE_WAIT = "wait"
+LOCK_MODE_NOWAIT = "nowait"
+LOCK_MODE_TIMEOUT = "timeout"
+
+_conflict_counts = Counter()
+_conflict_lock = threading.Lock()
+
+
+def get_error_code(error: Exception):
+    return getattr(error.__cause__, "pgcode", None)
+
+
+def count_conflict(name: str):
+    with _conflict_lock:
+        _conflict_counts[name] += 1
+
+
+def get_conflict_stats() -> dict:
+    with _conflict_lock:
+        return dict(_conflict_counts)
+
+
+def retry_on_conflict(func=None, *, attempts: int = None, base_delay: float = None):
+    """
+    Run ``func`` again when the database aborts it with a deadlock or a
+    serialization failure.
+
+    Waits a random delay (full jitter, doubling each attempt) between tries.
+    Nothing is retried inside an outer transaction, since that transaction is
+    already aborted and only its owner can start over.
+    """
+    if func is None:
+        return functools.partial(
+            retry_on_conflict, attempts=attempts, base_delay=base_delay
+        )
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        max_attempts = attempts or settings.DB_RETRY_ATTEMPTS
+        delay = base_delay or settings.DB_RETRY_BASE_DELAY
+
+        for attempt in range(1, max_attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                name = RETRYABLE_ERRORS.get(get_error_code(error))
+                in_atomic_block = any(
+                    conn.in_atomic_block
+                    for conn in connections.all(initialized_only=True)
+                )
+                if name is None or in_atomic_block:
+                    raise
+
+                count_conflict(name)
+                if attempt == max_attempts:
+                    count_conflict("gave_up")
+                    raise
+
+                logger.warning(
+                    "%s in %s, retry %s/%s", name, func.__name__, attempt, max_attempts
+                )
+                time.sleep(random.uniform(0, delay * 2 ** (attempt - 1)))
+
+    return wrapper
+
+
+class RowLocked(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Account is busy, please try again."
+    default_code = "locked"
+
+    def __init__(self, detail=None, code=None, wait=None):
+        super().__init__(detail, code)
+        # picked up by DRF's exception handler as the Retry-After header
+        self.wait = wait or settings.ACCOUNT_LOCK_RETRY_AFTER
+
+
+def lock_rows(queryset):
+    """``select_for_update()`` honouring ``ACCOUNT_LOCK_MODE``."""
+    return queryset.select_for_update(
+        nowait=settings.ACCOUNT_LOCK_MODE == LOCK_MODE_NOWAIT
+    )
+
+
+@contextmanager
+def lock_policy(using: str = None):
+    """
+    ``transaction.atomic()`` that gives up quickly on a locked row.
+
+    ``ACCOUNT_LOCK_MODE`` picks the behaviour: ``wait`` blocks like before,
+    ``timeout`` waits at most ``ACCOUNT_LOCK_TIMEOUT_MS`` per lock and
+    ``nowait`` fails immediately (``lock_rows`` uses NOWAIT and plain UPDATEs
+    get a 1ms lock timeout). A lock that cannot be taken raises ``RowLocked``,
+    a 409 with Retry-After, instead of holding the worker.
+
+    Runs on the shard selected with ``use_shard()`` unless ``using`` is given.
+    """
+    mode = settings.ACCOUNT_LOCK_MODE
+    using = using or account_db()
+    connection = connections[using]
+    try:
+        with transaction.atomic(using=using):
+            if mode != LOCK_MODE_WAIT and connection.vendor == "postgresql":
+                timeout = (
+                    settings.ACCOUNT_LOCK_TIMEOUT_MS if mode == LOCK_MODE_TIMEOUT else 1
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL lock_timeout = %s", [f"{timeout}ms"])
+            yield
+    except OperationalError as error:
+        if get_error_code(error) == LOCK_NOT_AVAILABLE:
+            count_conflict("lock_not_available")
+            raise RowLocked()
+        raise